@@ -0,0 +1,7 @@
+"""Offline CPU benchmarks for the gesture pipeline and game engines.
+
+Run from the backend directory::
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --compare baseline.json --output results.json
+"""
@@ -0,0 +1,237 @@
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from benchmarks import fixtures
+
+
+class Case:
+    """One benchmarked function: ``setup`` returns the call to time"""
+
+    def __init__(self, name: str, setup: Callable[[], Callable[[], object]],
+                 iterations: int = 2000, items_per_call: int = 1):
+        self.name = name
+        self.setup = setup
+        self.iterations = iterations
+        self.items_per_call = items_per_call
+
+
+def _cycle(inputs: Iterable, fn: Callable) -> Callable[[], object]:
+    source = itertools.cycle(inputs)
+    return lambda: fn(next(source))
+
+
+def _process_frame():
+    from gesture_engine import GestureRecognizer
+    recognizer = GestureRecognizer()
+    return _cycle(fixtures.hand_frames(), recognizer.process_frame)
+
+
+def _decode_frame():
+    from gesture_engine import decode_frame
+    return _cycle(fixtures.encoded_frames(), decode_frame)
+
+
+def _classify_landmarks(hands: int):
+    def setup():
+        from gesture_engine import GestureClassifier
+        classifier = GestureClassifier()
+        return _cycle(fixtures.landmark_sequence(hands=hands), classifier.classify_landmarks)
+    return setup
+
+
+def _classify_all_gestures(hands: int):
+    def setup():
+        from gesture_engine import GestureClassifier, extract_hand_features
+        classifier = GestureClassifier()
+        recording = fixtures.landmark_sequence(frames=hands * 8).reshape(-1, hands, 21, 3)
+        return _cycle(recording, lambda landmarks: classifier._classify_all_gestures(
+            extract_hand_features(landmarks)))
+    return setup
+
+
+def _template_classify(hands: int):
+    def setup():
+        from gesture_templates import TemplateLibrary, normalize_landmarks
+        # 2000 templates from the synthetic recording, labelled arbitrarily; only cost matters
+        templates = fixtures.landmark_sequence(frames=2000)[:, 0]
+        library = TemplateLibrary(normalize_landmarks(templates, 1.0), np.arange(2000) % 4,
+                                  ["drag", "draw", "pour", "zoom"], orientation_weight=1.0)
+        recording = fixtures.landmark_sequence(frames=hands * 8, seed=fixtures.SEED + 1).reshape(-1, hands, 21, 3)
+        return _cycle(recording, library.classify)
+    return setup
+
+
+def _user_analytics():
+    import database
+    pool = database.ConnectionPool(fixtures.progress_database())
+    with pool.connection() as conn:
+        problems = database.verify_query_plans(conn)
+    if problems:
+        raise RuntimeError("Query plans regressed: " + "; ".join(problems))
+
+    def analytics(user_id):
+        with pool.connection() as conn:
+            return database.user_analytics(conn, user_id)
+    return _cycle(range(1, 1001), analytics)
+
+
+def _analyze_drawing():
+    from games.math_game import MathGameEngine
+    engine = MathGameEngine()
+
+    def analyze(points):
+        # Shapes accumulate on the engine; keep the list from growing across iterations
+        engine.recognized_shapes.clear()
+        return engine.analyze_drawing(points)
+    return _cycle(fixtures.drawings(), analyze)
+
+
+def _calculate_trajectory():
+    from games.physics_game import PhysicsGameEngine
+    engine = PhysicsGameEngine()
+    engine.objects = engine.initialize_game(1)["objects"]
+    return _cycle(fixtures.forces(), lambda force: engine.calculate_trajectory(1, force))
+
+
+def _validate_code():
+    from games.coding_game import CodingGameEngine
+    engine = CodingGameEngine()
+    engine.current_challenge = engine._create_beginner_challenge("loops")
+    return _cycle(fixtures.programs(engine.current_challenge["solution"]), engine.validate_code)
+
+
+CASES = [
+    Case("gesture.process_frame", _process_frame, iterations=300),
+    Case("gesture.decode_frame", _decode_frame, iterations=500),
+    Case("gesture.classify_landmarks[1hand]", _classify_landmarks(1)),
+    Case("gesture.classify_landmarks[2hands]", _classify_landmarks(2)),
+    Case("gesture.classify_all_gestures[1hand]", _classify_all_gestures(1)),
+    Case("gesture.classify_all_gestures[256hands]", _classify_all_gestures(256),
+         iterations=200, items_per_call=256),
+    Case("gesture.template_classify[1hand]", _template_classify(1)),
+    Case("gesture.template_classify[256hands]", _template_classify(256),
+         iterations=200, items_per_call=256),
+    Case("db.user_analytics[200k rows]", _user_analytics),
+    Case("math.analyze_drawing", _analyze_drawing),
+    Case("physics.calculate_trajectory", _calculate_trajectory),
+    Case("coding.validate_code", _validate_code),
+]
+
+
+def measure(case: Case, scale: float = 1.0, warmup: int = 20) -> Optional[Dict]:
+    """Time every call individually and summarize latency and throughput.
+    
+    Returns None when the case needs an optional dependency (MediaPipe for
+    the gesture cases) that is not installed.
+    """
+    try:
+        call = case.setup()
+    except ImportError:
+        return None
+
+    for _ in range(warmup):
+        call()
+
+    iterations = max(1, int(case.iterations * scale))
+    samples = np.empty(iterations, dtype=np.float64)
+    clock = time.perf_counter
+    for index in range(iterations):
+        start = clock()
+        call()
+        samples[index] = clock() - start
+
+    total = float(samples.sum())
+    p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1000
+    return {
+        "iterations": iterations,
+        "items_per_second": round(iterations * case.items_per_call / total, 1),
+        "mean_ms": round(float(samples.mean()) * 1000, 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+    }
+
+
+def environment() -> Dict:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": np.__version__,
+        "seed": fixtures.SEED,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        import cv2
+        info["opencv"] = cv2.__version__
+        import mediapipe
+        info["mediapipe"] = mediapipe.__version__
+    except (ImportError, AttributeError):
+        pass
+    return info
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Print p50/throughput deltas against a baseline and return regressed case names"""
+    regressions = []
+    print(f"\n{'case':44} {'p50 base':>10} {'p50 now':>10} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None or result is None:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:44} {before['p50_ms']:>10.4f} {result['p50_ms']:>10.4f} {change:>+8.1%}{marker}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="p50 slowdown that counts as a regression (default 0.10)")
+    parser.add_argument("--only", action="append", default=[],
+                        help="run cases whose name contains this text (repeatable)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every case's iteration count")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'case':44} {'items/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for case in CASES:
+        if args.only and not any(text in case.name for text in args.only):
+            continue
+        result = measure(case, args.scale)
+        results[case.name] = result
+        if result is None:
+            print(f"{case.name:44} skipped (dependency not installed)")
+        else:
+            print(f"{case.name:44} {result['items_per_second']:>12.1f} {result['p50_ms']:>9.4f} "
+                  f"{result['p95_ms']:>9.4f} {result['p99_ms']:>9.4f}")
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(json.load(handle), report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
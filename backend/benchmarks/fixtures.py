@@ -0,0 +1,155 @@
+"""Deterministic synthetic inputs for the benchmarks.
+
+Everything is generated from a fixed seed, so two runs on the same machine
+time exactly the same work and results are comparable across commits.
+"""
+import atexit
+import math
+import os
+import shutil
+import tempfile
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+SEED = 20240611
+
+# Finger chains as (landmark indices, base angle in radians off the palm axis)
+_FINGERS = [
+    ((1, 2, 3, 4), -0.9),
+    ((5, 6, 7, 8), -0.3),
+    ((9, 10, 11, 12), 0.0),
+    ((13, 14, 15, 16), 0.25),
+    ((17, 18, 19, 20), 0.5),
+]
+
+
+def _hand_pose(rng: np.random.Generator, center: Tuple[float, float], scale: float,
+               tilt: float, curl: float) -> np.ndarray:
+    """One (21, 3) hand in MediaPipe's normalized coordinates"""
+    hand = np.zeros((21, 3), dtype=np.float32)
+    hand[0, :2] = center
+    for indices, spread in _FINGERS:
+        angle = tilt + spread
+        x, y = center
+        for joint, index in enumerate(indices):
+            # Curled fingers bend further back toward the palm at every joint
+            angle += curl * joint * 0.4
+            length = scale * (0.35 if joint == 0 else 0.22)
+            x += length * math.sin(angle)
+            y -= length * math.cos(angle)
+            hand[index] = (x, y, -0.02 * joint)
+    hand[:, :2] += rng.normal(0.0, scale * 0.01, size=(21, 2))
+    return hand
+
+
+def landmark_sequence(frames: int = 600, hands: int = 1, seed: int = SEED) -> np.ndarray:
+    """A (frames, hands, 21, 3) recording of hands drifting, tilting and pinching"""
+    rng = np.random.default_rng(seed)
+    sequence = np.empty((frames, hands, 21, 3), dtype=np.float32)
+    for frame in range(frames):
+        phase = frame / 30.0
+        for hand in range(hands):
+            center = (0.35 + 0.3 * hand + 0.05 * math.sin(phase + hand), 0.7 + 0.05 * math.cos(phase))
+            tilt = 0.6 * math.sin(phase * 0.7 + hand)
+            curl = 0.5 + 0.5 * math.sin(phase * 1.3 + hand)
+            sequence[frame, hand] = _hand_pose(rng, center, 0.18, tilt, curl)
+    return sequence
+
+
+def hand_frames(count: int = 60, size: Tuple[int, int] = (640, 480), seed: int = SEED) -> List[np.ndarray]:
+    """BGR camera-sized frames with a skin-toned hand moving over a noisy background"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    poses = landmark_sequence(count, hands=1, seed=seed)
+
+    frames = []
+    for pose in poses:
+        frame = background.copy()
+        points = (pose[0, :, :2] * (width, height)).astype(np.int32)
+        skin = (120, 160, 220)
+        cv2.circle(frame, tuple(int(v) for v in points[0]), width // 20, skin, -1)
+        for indices, _ in _FINGERS:
+            chain = [points[0]] + [points[index] for index in indices]
+            cv2.polylines(frame, [np.array(chain)], False, skin, width // 60)
+        frames.append(frame)
+    return frames
+
+
+def encoded_frames(count: int = 60, quality: int = 80, seed: int = SEED) -> List[bytes]:
+    """The synthetic frames as JPEG uploads, as the browser sends them"""
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    return [cv2.imencode(".jpg", frame, params)[1].tobytes() for frame in hand_frames(count, seed=seed)]
+
+
+def drawings(count: int = 200, seed: int = SEED) -> List[List[Tuple[float, float]]]:
+    """Noisy hand-drawn circles, squares, rectangles and triangles"""
+    rng = np.random.default_rng(seed)
+    shapes = []
+    for index in range(count):
+        kind = index % 4
+        points_per_shape = int(rng.integers(24, 96))
+        t = np.linspace(0.0, 1.0, points_per_shape, endpoint=False)
+        if kind == 0:
+            x, y = 100 * np.cos(2 * np.pi * t), 100 * np.sin(2 * np.pi * t)
+        else:
+            corners = {
+                1: [(0, 0), (100, 0), (100, 100), (0, 100)],
+                2: [(0, 0), (220, 0), (220, 80), (0, 80)],
+                3: [(0, 0), (120, 0), (60, 100)],
+            }[kind]
+            corners = np.array(corners + corners[:1], dtype=float)
+            # Walk the outline at a constant rate between consecutive corners
+            position = t * (len(corners) - 1)
+            segment = position.astype(int)
+            frac = (position - segment)[:, None]
+            outline = corners[segment] * (1 - frac) + corners[segment + 1] * frac
+            x, y = outline[:, 0], outline[:, 1]
+        x = x + rng.normal(0, 2.0, points_per_shape)
+        y = y + rng.normal(0, 2.0, points_per_shape)
+        shapes.append(list(zip(x.tolist(), y.tolist())))
+    return shapes
+
+
+def forces(count: int = 200, seed: int = SEED) -> List[dict]:
+    """Launch forces spanning short hops to out-of-bounds throws"""
+    rng = np.random.default_rng(seed)
+    return [{"x": float(x), "y": float(y)} for x, y in rng.uniform((-50, -120), (150, 20), size=(count, 2))]
+
+
+def programs(solution: List[str], count: int = 200, seed: int = SEED) -> List[List[str]]:
+    """Block programs derived from a solution by dropping, duplicating and editing blocks"""
+    rng = np.random.default_rng(seed)
+    vocabulary = ["loop 3", "print 7", "set_var x 1", "if x > 2", "else", "print done"]
+    result = []
+    for _ in range(count):
+        blocks = list(solution)
+        for _ in range(int(rng.integers(0, 4))):
+            action = int(rng.integers(0, 3))
+            position = int(rng.integers(0, len(blocks) + 1))
+            if action == 0 and blocks:
+                blocks.pop(min(position, len(blocks) - 1))
+            elif action == 1:
+                blocks.insert(position, vocabulary[int(rng.integers(0, len(vocabulary)))])
+            elif blocks:
+                blocks.insert(position, blocks[min(position, len(blocks) - 1)])
+        result.append(blocks)
+    return result
+
+
+def progress_database(rows: int = 200000, users: int = 1000, seed: int = SEED) -> str:
+    """A scratch SQLite file with the app schema and ``rows`` synthetic progress rows, removed at exit"""
+    import database
+
+    directory = tempfile.mkdtemp(prefix="bench-db-")
+    atexit.register(shutil.rmtree, directory, True)
+    path = os.path.join(directory, "progress.db")
+    pool = database.ConnectionPool(path, size=1)
+    with pool.connection() as conn:
+        database.create_schema(conn)
+        database.fill_synthetic_progress(conn, rows, users, seed)
+        conn.execute("ANALYZE")
+    pool.close()
+    return path
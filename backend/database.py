@@ -1,11 +1,252 @@
+import asyncio
+import json
+import os
+import queue
+import random
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
 
-DATABASE_URL = "rural_stem_quest.db"
+import metrics
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "rural_stem_quest.db")
+# Connections kept open and handed out one request at a time
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+# Seconds to wait for a free connection, and for another writer's lock
+DB_TIMEOUT = float(os.environ.get("DB_TIMEOUT", "5"))
+# Page cache per connection, in KiB
+DB_CACHE_KIB = int(os.environ.get("DB_CACHE_KIB", "16384"))
+# Operations queued or running on the DB threads before new ones are refused
+DB_MAX_PENDING = int(os.environ.get("DB_MAX_PENDING", "64"))
+
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_seconds",
+    "Time each database operation held its connection, i.e. would have blocked the event loop",
+    ["query"]
+)
+DB_WAIT_SECONDS = metrics.histogram(
+    "db_wait_seconds",
+    "Time each database operation queued for a DB thread",
+    ["query"]
+)
+
+T = TypeVar("T")
+
+
+class DatabaseBusy(Exception):
+    """Raised when no pooled connection frees up within the timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections.
+    
+    A connection is checked out by one request at a time and returned for
+    reuse afterwards, so its page cache stays warm and the connect and PRAGMA
+    setup is paid once. FastAPI may run a dependency and its handler on
+    different threads, so connections are opened with check_same_thread=False
+    and handed out exclusively rather than pinned to a thread; the most
+    recently returned connection is reused first.
+    
+    The database runs in WAL mode: readers no longer wait for /progress/
+    commits, and writers wait on each other for up to ``timeout`` seconds
+    instead of failing with "database is locked".
+    """
+    
+    def __init__(self, database: str, size: int = 8, timeout: float = 5.0, cache_kib: int = 16384):
+        self.database = database
+        self.timeout = timeout
+        self.cache_kib = cache_kib
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL a commit only needs the log written, not fsynced; still safe against app crashes
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_kib}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; an uncommitted transaction is rolled back on return"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise DatabaseBusy("All database connections are busy")
+        
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+    
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped; the next checkout opens a fresh one
+            conn.close()
+        else:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+    
+    def close(self):
+        """Close idle connections; ones still checked out close when returned"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool: Optional[ConnectionPool] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DATABASE_URL, DB_POOL_SIZE, DB_TIMEOUT, DB_CACHE_KIB)
+        return _pool
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            # One thread per pooled connection, so a running operation never waits for one;
+            # the progress writer, the only other long-lived user, has a connection of its own
+            _executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+        return _executor
+
+def close_pool():
+    global _pool, _executor
+    with _pool_lock:
+        executor, _executor = _executor, None
+        pool, _pool = _pool, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    if pool is not None:
+        pool.close()
+
+def _finish_pending(_future):
+    global _pending
+    with _pool_lock:
+        _pending -= 1
+
+async def run_db(fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn(conn, *args)`` on a DB thread with a pooled connection.
+    
+    Keeps blocking sqlite3 calls off the event loop. Operations are timed
+    per ``fn`` in db_query_seconds and db_wait_seconds. Once DB_MAX_PENDING
+    operations are queued or running, DatabaseBusy is raised straight away
+    so a stalled database sheds load instead of piling up requests.
+    """
+    global _pending
+    with _pool_lock:
+        if _pending >= DB_MAX_PENDING:
+            raise DatabaseBusy("Too many database operations queued")
+        _pending += 1
+    queued = time.perf_counter()
+    
+    def call() -> T:
+        with get_db() as conn:
+            start = time.perf_counter()
+            DB_WAIT_SECONDS.observe(start - queued, fn.__name__)
+            try:
+                return fn(conn, *args)
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - start, fn.__name__)
+    
+    try:
+        future = _get_executor().submit(call)
+    except BaseException:
+        _finish_pending(None)
+        raise
+    # Runs even if the operation is cancelled before it starts
+    future.add_done_callback(_finish_pending)
+    return await asyncio.wrap_future(future)
+
+def pending_operations() -> int:
+    return _pending
+
+# Secondary indexes for the per-user queries
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_analytics_user_date ON analytics (user_id, session_date)",
+    "CREATE INDEX IF NOT EXISTS idx_users_school_role_grade ON users (school, role, grade)",
+]
+
+# Per user, game and UTC day totals of progress, so analytics reads are
+# O(days x games) however many sessions a student has played. Keyed by day
+# before game so a date window is one range per student. The trigger
+# keeps them up to date inside the same transaction as every progress
+# insert; rows changed or deleted by hand need rebuild_progress_daily.
+PROGRESS_DAILY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS progress_daily (
+        user_id INTEGER NOT NULL,
+        game_id INTEGER NOT NULL,
+        day DATE NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        score_total INTEGER NOT NULL DEFAULT 0,
+        time_spent INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, game_id)
+    ) WITHOUT ROWID
+'''
+PROGRESS_DAILY_TRIGGER = '''
+    CREATE TRIGGER IF NOT EXISTS progress_daily_insert AFTER INSERT ON progress
+    WHEN NEW.user_id IS NOT NULL AND NEW.game_id IS NOT NULL AND NEW.created_at IS NOT NULL
+    BEGIN
+        INSERT INTO progress_daily (user_id, game_id, day, sessions, score_total, time_spent, completed)
+        VALUES (NEW.user_id, NEW.game_id, DATE(NEW.created_at), 1, COALESCE(NEW.score, 0),
+                COALESCE(NEW.time_spent, 0), COALESCE(NEW.completed, 0))
+        ON CONFLICT (user_id, day, game_id) DO UPDATE SET
+            sessions = sessions + 1,
+            score_total = score_total + excluded.score_total,
+            time_spent = time_spent + excluded.time_spent,
+            completed = completed + excluded.completed;
+    END
+'''
+REBUILD_PROGRESS_DAILY_SQL = '''
+    INSERT INTO progress_daily (user_id, game_id, day, sessions, score_total, time_spent, completed)
+    SELECT user_id, game_id, DATE(created_at), COUNT(*), SUM(COALESCE(score, 0)),
+           SUM(COALESCE(time_spent, 0)), SUM(COALESCE(completed, 0))
+    FROM progress
+    WHERE user_id IS NOT NULL AND game_id IS NOT NULL AND created_at IS NOT NULL
+    GROUP BY user_id, game_id, DATE(created_at)
+'''
 
 def init_db():
-    conn = sqlite3.connect(DATABASE_URL)
+    with get_pool().connection() as conn:
+        create_schema(conn)
+
+def create_schema(conn: sqlite3.Connection):
     cursor = conn.cursor()
+    # One write transaction, so API processes starting together on an existing
+    # database cannot both find the rollup missing (or games empty) and fill it
+    cursor.execute("BEGIN IMMEDIATE")
     
     # Users table
     cursor.execute('''
@@ -32,7 +273,7 @@ def init_db():
             gesture_type TEXT NOT NULL,
             difficulty TEXT DEFAULT 'beginner',
             content_url TEXT,
-            game_data TEXT,  # JSON data for game configuration
+            game_data TEXT,  -- JSON data for game configuration
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     ''')
@@ -47,13 +288,23 @@ def init_db():
             time_spent INTEGER DEFAULT 0,
             completed BOOLEAN DEFAULT FALSE,
             gestures_used TEXT,
-            game_specific_data TEXT,  # JSON for game-specific progress
+            game_specific_data TEXT,  -- JSON for game-specific progress
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            client_key TEXT,  -- Device-generated idempotency key of synced offline records
             FOREIGN KEY (user_id) REFERENCES users (id),
             FOREIGN KEY (game_id) REFERENCES games (id)
         )
     ''')
     
+    # Databases created before offline sync lack the idempotency key
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(progress)")}
+    if "client_key" not in columns:
+        cursor.execute("ALTER TABLE progress ADD COLUMN client_key TEXT")
+    # Keys are unique per user; rows without a key (NULL) never conflict
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_progress_client_key ON progress (user_id, client_key)
+    ''')
+    
     # Analytics table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS analytics (
@@ -68,6 +319,17 @@ def init_db():
         )
     ''')
     
+    for statement in INDEXES:
+        cursor.execute(statement)
+    
+    # Daily rollup; filled from existing progress the first time it is created
+    rollup_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'progress_daily'").fetchone() is not None
+    cursor.execute(PROGRESS_DAILY_TABLE)
+    cursor.execute(PROGRESS_DAILY_TRIGGER)
+    if not rollup_exists:
+        cursor.execute(REBUILD_PROGRESS_DAILY_SQL)
+    
     # Insert sample games with enhanced data
     sample_games = [
         ('Physics Puzzle', 'physics', 'Drag objects using hand gestures to learn Newton\'s laws', 'drag_drop', 'beginner', 
@@ -86,19 +348,332 @@ def init_db():
          '{"languages": ["python", "scratch", "blockly"], "concepts": ["loops", "conditionals", "functions"]}')
     ]
     
-    cursor.executemany('''
-        INSERT OR IGNORE INTO games (title, subject, description, gesture_type, difficulty, game_data)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', sample_games)
+    # games has no unique key for OR IGNORE to act on, so seed only an empty table
+    cursor.execute("SELECT 1 FROM games LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.executemany('''
+            INSERT INTO games (title, subject, description, gesture_type, difficulty, game_data)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', sample_games)
     
     conn.commit()
-    conn.close()
 
 @contextmanager
-def get_db():
-    conn = sqlite3.connect(DATABASE_URL)
-    conn.row_factory = sqlite3.Row
-    try:
+def get_db() -> Iterator[sqlite3.Connection]:
+    with get_pool().connection() as conn:
         yield conn
-    finally:
-        conn.close()
\ No newline at end of file
+
+# Queries, run through run_db; each takes the connection first
+
+USER_EXISTS_SQL = "SELECT id FROM users WHERE email = ? OR username = ?"
+INSERT_USER_SQL = '''
+    INSERT INTO users (username, email, password_hash, role, school, grade, language)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+GAME_BY_ID_SQL = "SELECT * FROM games WHERE id = ?"
+
+_PROGRESS_COLUMNS = "user_id, game_id, score, time_spent, completed, gestures_used, game_specific_data, " \
+                    "created_at, client_key"
+INSERT_PROGRESS_SQL = f"INSERT INTO progress ({_PROGRESS_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_PROGRESS_IF_NEW_SQL = f"INSERT OR IGNORE INTO progress ({_PROGRESS_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+# Both read the progress_daily rollup, one primary key range per user. The
+# per-game totals are grouped in a temp B-tree: the key orders by day first.
+ANALYTICS_PROGRESS_SQL = '''
+    SELECT g.title, g.subject, CAST(SUM(d.score_total) AS REAL) / SUM(d.sessions) as avg_score,
+           SUM(d.time_spent) as total_time, SUM(d.sessions) as games_played
+    FROM progress_daily d
+    JOIN games g ON d.game_id = g.id
+    WHERE d.user_id = ?
+    GROUP BY d.game_id
+'''
+ANALYTICS_WEEKLY_SQL = '''
+    SELECT day as date, SUM(time_spent) as daily_time
+    FROM progress_daily
+    WHERE user_id = ? AND day >= date('now', '-7 days')
+    GROUP BY day
+'''
+
+# Class and school aggregates over progress_daily, for students in :school, or
+# in :school and :grade when {grade_filter} is GRADE_FILTER_SQL; :since is a
+# date() modifier such as "-30 days". Teachers share the school but are left
+# out. Grouping by u.grade, u.id follows idx_users_school_role_grade, so
+# per-student totals need no sort.
+GRADE_FILTER_SQL = "AND u.grade = :grade"
+GROUP_STUDENT_TOTALS_SQL = '''
+    SELECT u.grade, SUM(d.sessions) as sessions, SUM(d.score_total) as score_total,
+           COALESCE(SUM(d.time_spent), 0) as time_spent
+    FROM users u
+    LEFT JOIN progress_daily d ON d.user_id = u.id AND d.day >= date('now', :since)
+    WHERE u.school = :school AND u.role = 'student' {grade_filter}
+    GROUP BY u.grade, u.id
+'''
+# Distinct students per subject, so one playing several games of it counts once
+GROUP_SUBJECTS_SQL = '''
+    SELECT g.subject, CAST(SUM(d.score_total) AS REAL) / SUM(d.sessions) as avg_score,
+           SUM(d.sessions) as sessions, SUM(d.time_spent) as total_time,
+           CAST(SUM(d.completed) AS REAL) / SUM(d.sessions) as completion_rate,
+           COUNT(DISTINCT d.user_id) as students
+    FROM users u
+    JOIN progress_daily d ON d.user_id = u.id AND d.day >= date('now', :since)
+    JOIN games g ON g.id = d.game_id
+    WHERE u.school = :school AND u.role = 'student' {grade_filter}
+    GROUP BY g.subject
+    ORDER BY g.subject
+'''
+GROUP_ENGAGEMENT_SQL = '''
+    SELECT d.day as date, SUM(d.time_spent) as total_time, SUM(d.sessions) as sessions,
+           COUNT(DISTINCT d.user_id) as active_students
+    FROM users u
+    JOIN progress_daily d ON d.user_id = u.id AND d.day >= date('now', :since)
+    WHERE u.school = :school AND u.role = 'student' {grade_filter}
+    GROUP BY d.day
+    ORDER BY d.day
+'''
+
+# Hot queries and the access paths each must search with, checked by verify_query_plans
+QUERY_PLANS = [
+    ("analytics progress", ANALYTICS_PROGRESS_SQL, (1,), ("PRIMARY KEY",)),
+    ("analytics weekly engagement", ANALYTICS_WEEKLY_SQL, (1,), ("PRIMARY KEY",)),
+] + [
+    (f"{name} {scope}", sql.format(grade_filter=grade_filter), {"school": "school", "grade": 6, "since": "-30 days"},
+     ("INDEX idx_users_school_role_grade", "PRIMARY KEY"))
+    for name, sql in (("group student totals", GROUP_STUDENT_TOTALS_SQL), ("group subjects", GROUP_SUBJECTS_SQL),
+                      ("group engagement", GROUP_ENGAGEMENT_SQL))
+    for scope, grade_filter in (("by school", ""), ("by grade", GRADE_FILTER_SQL))
+]
+
+def insert_user(conn: sqlite3.Connection, username: str, email: str, password_hash: str, role: str,
+                school: Optional[str], grade: Optional[int], language: str) -> Optional[int]:
+    """Create a user and return its id, or None if the username or email is taken"""
+    cursor = conn.cursor()
+    cursor.execute(USER_EXISTS_SQL, (email, username))
+    if cursor.fetchone():
+        return None
+    
+    cursor.execute(INSERT_USER_SQL, (username, email, password_hash, role, school, grade, language))
+    conn.commit()
+    return cursor.lastrowid
+
+def list_games(conn: sqlite3.Connection, subject: Optional[str] = None,
+               difficulty: Optional[str] = None) -> List[Dict]:
+    query = "SELECT * FROM games"
+    params = []
+    
+    if subject or difficulty:
+        query += " WHERE"
+        conditions = []
+        if subject:
+            conditions.append(" subject = ?")
+            params.append(subject)
+        if difficulty:
+            conditions.append(" difficulty = ?")
+            params.append(difficulty)
+        query += " AND".join(conditions)
+    
+    return [dict(game) for game in conn.execute(query, params).fetchall()]
+
+def get_game(conn: sqlite3.Connection, game_id: int) -> Optional[Dict]:
+    game = conn.execute(GAME_BY_ID_SQL, (game_id,)).fetchone()
+    return dict(game) if game else None
+
+def sqlite_timestamp(value: datetime) -> str:
+    """Format a datetime the way CURRENT_TIMESTAMP does: UTC, to the second; naive values are taken as UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def progress_row(user_id: int, game_id: int, score: int, time_spent: int, completed: bool,
+                 gestures_used: Dict, game_specific_data: Optional[Dict],
+                 created_at: Optional[datetime] = None, client_key: Optional[str] = None) -> Tuple:
+    """Column values for insert_progress_rows; created_at defaults to now, as CURRENT_TIMESTAMP would"""
+    return (user_id, game_id, score, time_spent, completed, json.dumps(gestures_used),
+            json.dumps(game_specific_data) if game_specific_data else None,
+            sqlite_timestamp(created_at or datetime.now(timezone.utc)), client_key)
+
+def insert_progress_rows(conn: sqlite3.Connection, rows: Sequence[Tuple]) -> int:
+    """Insert progress_row tuples in one transaction"""
+    conn.executemany(INSERT_PROGRESS_SQL, rows)
+    conn.commit()
+    return len(rows)
+
+def insert_progress_records(conn: sqlite3.Connection, rows: Sequence[Tuple]) -> List[bool]:
+    """Insert keyed progress_row tuples in one transaction, skipping keys already stored.
+    
+    Returns, per row, whether it was inserted (False for a duplicate key).
+    """
+    cursor = conn.cursor()
+    inserted = []
+    for row in rows:
+        cursor.execute(INSERT_PROGRESS_IF_NEW_SQL, row)
+        inserted.append(cursor.rowcount == 1)
+    conn.commit()
+    return inserted
+
+def group_analytics(conn: sqlite3.Connection, school: str, grade: Optional[int] = None,
+                    days: int = 30) -> Optional[Dict[str, Any]]:
+    """Aggregates over a school, or one grade of it, for the last ``days`` days; None if it has no students"""
+    params = {"school": school, "grade": grade, "since": f"-{days} days"}
+    grade_filter = "" if grade is None else GRADE_FILTER_SQL
+    
+    def fetch(sql: str) -> List[Dict]:
+        return [dict(row) for row in conn.execute(sql.format(grade_filter=grade_filter), params)]
+    
+    students = fetch(GROUP_STUDENT_TOTALS_SQL)
+    if not students:
+        return None
+    
+    # At most one row per student, so grade summaries and score bands are cheap to finish here
+    grades: Dict[Optional[int], Dict] = {}
+    bands = [0] * 10
+    for student in students:
+        summary = grades.setdefault(student["grade"], {
+            "grade": student["grade"], "students": 0, "active_students": 0,
+            "sessions": 0, "score_total": 0, "total_time": 0
+        })
+        summary["students"] += 1
+        summary["total_time"] += student["time_spent"]
+        if student["sessions"]:
+            summary["active_students"] += 1
+            summary["sessions"] += student["sessions"]
+            summary["score_total"] += student["score_total"]
+            # 10-point bands of each student's average score; 90 and above share the top one
+            bands[min(max(int(student["score_total"] / student["sessions"] // 10), 0), 9)] += 1
+    for summary in grades.values():
+        sessions = summary.pop("sessions")
+        score_total = summary.pop("score_total")
+        summary["avg_score"] = score_total / sessions if sessions else None
+    
+    return {
+        "school": school,
+        "grade": grade,
+        "days": days,
+        "students": len(students),
+        "active_students": sum(summary["active_students"] for summary in grades.values()),
+        "grades": list(grades.values()),
+        "subjects": fetch(GROUP_SUBJECTS_SQL),
+        "engagement": fetch(GROUP_ENGAGEMENT_SQL),
+        "score_distribution": [
+            {"band": f"{band * 10}-{band * 10 + 9}" if band < 9 else "90+", "students": count}
+            for band, count in enumerate(bands)
+        ]
+    }
+
+def explain_query(conn: sqlite3.Connection, sql: str, params: Union[Sequence, Dict[str, Any]] = ()) -> List[str]:
+    """The EXPLAIN QUERY PLAN steps for a query, e.g. "SEARCH p USING COVERING INDEX ..." """
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def verify_query_plans(conn: sqlite3.Connection) -> List[str]:
+    """Check every QUERY_PLANS query searches its indexes or keys; returns the problems found"""
+    problems = []
+    for name, sql, params, paths in QUERY_PLANS:
+        plan = explain_query(conn, sql, params)
+        for access in paths:
+            if not any(step.startswith("SEARCH ") and f" {access} " in f"{step} " for step in plan):
+                problems.append(f"{name} does not search by {access}: {'; '.join(plan)}")
+        # Scanning a subquery's own (already searched) rows is fine
+        subqueries = {step.split()[1] for step in plan if step.startswith(("MATERIALIZE ", "CO-ROUTINE "))}
+        for step in plan:
+            if step.startswith("SCAN ") and " INDEX " not in step and not step.startswith("SCAN (") \
+                    and step.split()[1] not in subqueries:
+                problems.append(f"{name} scans a whole table: {step}")
+    return problems
+
+def rebuild_progress_daily(conn: sqlite3.Connection) -> int:
+    """Recompute the progress_daily rollup from every progress row, in one transaction"""
+    conn.execute("DELETE FROM progress_daily")
+    rows = conn.execute(REBUILD_PROGRESS_DAILY_SQL).rowcount
+    conn.commit()
+    return rows
+
+def user_analytics(conn: sqlite3.Connection, user_id: int) -> Dict[str, List[Dict]]:
+    cursor = conn.cursor()
+    
+    # Get user progress
+    cursor.execute(ANALYTICS_PROGRESS_SQL, (user_id,))
+    progress_data = cursor.fetchall()
+    
+    # Get weekly engagement
+    cursor.execute(ANALYTICS_WEEKLY_SQL, (user_id,))
+    weekly_engagement = cursor.fetchall()
+    
+    return {
+        "progress": [dict(row) for row in progress_data],
+        "weekly_engagement": [dict(row) for row in weekly_engagement]
+    }
+
+def fill_synthetic_progress(conn: sqlite3.Connection, rows: int, users: int, seed: int = 20240611):
+    """Insert seeded random progress spread over users, the sample games and the last 60 days"""
+    rng = random.Random(seed)
+    now = time.time()
+    
+    def generate():
+        for _ in range(rows):
+            created = datetime.fromtimestamp(now - rng.random() * 60 * 86400, timezone.utc)
+            yield progress_row(rng.randint(1, users), rng.randint(1, 5), rng.randint(0, 100),
+                               rng.randint(10, 600), rng.random() < 0.5, {}, None, created)
+    
+    conn.executemany(INSERT_PROGRESS_SQL, generate())
+    conn.commit()
+
+def _check_plans(rows: int, users: int) -> int:
+    import tempfile
+    
+    # Always a scratch database: create_schema must never run against a live one just to check plans
+    with tempfile.TemporaryDirectory() as scratch:
+        pool = ConnectionPool(os.path.join(scratch, "plans.db"), size=1)
+        with pool.connection() as conn:
+            create_schema(conn)
+            if rows:
+                fill_synthetic_progress(conn, rows, users)
+                # Plans as they will be once statistics exist, not just from heuristics
+                conn.execute("ANALYZE")
+            
+            for name, sql, params, _ in QUERY_PLANS:
+                print(f"{name}:\n    " + "\n    ".join(explain_query(conn, sql, params)))
+            problems = verify_query_plans(conn)
+            
+            if rows:
+                timings = []
+                for user_id in range(1, 101):
+                    start = time.perf_counter()
+                    user_analytics(conn, user_id)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                print(f"user_analytics over {rows} rows: p50 {timings[50] * 1000:.2f} ms, "
+                      f"max {timings[-1] * 1000:.2f} ms")
+        pool.close()
+    
+    for problem in problems:
+        print(f"PROBLEM: {problem}")
+    return 1 if problems else 0
+
+def _rebuild_rollups() -> int:
+    pool = ConnectionPool(DATABASE_URL, size=1)
+    with pool.connection() as conn:
+        create_schema(conn)
+        start = time.perf_counter()
+        days = rebuild_progress_daily(conn)
+        print(f"Rebuilt progress_daily for {DATABASE_URL}: {days} rows in {time.perf_counter() - start:.2f}s")
+    pool.close()
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Database maintenance for DATABASE_URL")
+    commands = parser.add_subparsers(dest="command")
+    check = commands.add_parser("check-plans", help="check on a scratch database that the hot queries are "
+                                                    "answered from their indexes (the default)")
+    check.add_argument("--rows", type=int, default=0, help="fill the scratch database with this many progress "
+                                                           "rows first, and time user_analytics on it")
+    check.add_argument("--users", type=int, default=5000, help="users the scratch rows are spread over")
+    commands.add_parser("rebuild-rollups", help="recompute progress_daily from the progress table")
+    args = parser.parse_args(argv)
+    
+    if args.command == "rebuild-rollups":
+        return _rebuild_rollups()
+    return _check_plans(getattr(args, "rows", 0), getattr(args, "users", 5000))
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+"""Compact binary encoding for gesture results.
+
+Clients opt in by sending ``Accept: application/x-gesture-compact`` (add
+``; precision=float32`` for full-precision landmarks); JSON stays the
+default. WebSocket clients pass ``?encoding=compact`` (or ``compact32``)
+and then receive binary messages. All values are little-endian:
+
+    header    magic "GC", version u8, flags u8, hands u8, gestures u8
+    per hand  landmarks 21 x 3, palm center 3, bbox x_min y_min x_max y_max
+              (float16, or float32 when flag bit 1 is set)
+    per gesture  type u8, confidence u8, direction u8, scale u8, hands u8
+    motion    palm velocity x y z per hand, then velocity x y and angular
+              velocity per gesture (same float width as the hands, NaN
+              where a gesture has no such field); only with flag bit 2
+
+Flag bit 0 marks a stale (motion-gated) result and flag bit 2 one that
+carries temporal tracking output (``palm_velocity``). Confidence and scale
+are quantized to 0-255 over 0.0-1.0, and a gesture's hands count of 0
+means it has none. Fingertip positions are not repeated; they are
+landmarks 4, 8, 12, 16 and 20 of each hand.
+"""
+import struct
+from typing import Dict, List, Optional
+
+import numpy as np
+
+COMPACT_MEDIA_TYPE = "application/x-gesture-compact"
+COMPACT_VERSION = 2
+
+FLAG_STALE = 0x01
+FLAG_FLOAT32 = 0x02
+FLAG_MOTION = 0x04
+
+# Codes are part of the wire format: append new gesture types, never reorder.
+# Template libraries may define other labels; those are sent as "other".
+GESTURE_TYPES = ["other", "drag", "draw", "pour", "rotate", "zoom"]
+GESTURE_CODES = {name: code for code, name in enumerate(GESTURE_TYPES)}
+DIRECTIONS = ["", "left", "right", "clockwise", "counterclockwise", "in", "out"]
+DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+_HEADER = struct.Struct("<2sBBBB")
+# landmarks, palm center and bounding box floats per hand
+_FLOATS_PER_HAND = 21 * 3 + 3 + 4
+_GESTURE_SIZE = 5
+# Motion block floats: palm velocity per hand; velocity and angular velocity per gesture
+_MOTION_PER_HAND = 3
+_MOTION_PER_GESTURE = 3
+
+
+def negotiate_precision(accept: Optional[str]) -> Optional[int]:
+    """Return 16 or 32 if the Accept header asks for the compact encoding, else None"""
+    if not accept or COMPACT_MEDIA_TYPE not in accept:
+        return None
+    return 32 if "precision=float32" in accept else 16
+
+
+def stream_precision(encoding: Optional[str]) -> Optional[int]:
+    """Map a WebSocket ``?encoding=`` value (compact, compact32) to a precision"""
+    return {"compact": 16, "compact32": 32}.get(encoding or "")
+
+
+def _quantize(value: float) -> int:
+    return int(round(min(1.0, max(0.0, value)) * 255))
+
+
+def encode_compact(gesture_data: Dict, precision: int = 16) -> bytes:
+    """Pack a process_frame/classify_landmarks result into the compact format"""
+    hands = gesture_data["hands_detected"]
+    gestures = gesture_data["gestures"]
+
+    flags = FLAG_FLOAT32 if precision == 32 else 0
+    if gesture_data.get("stale"):
+        flags |= FLAG_STALE
+    motion = "palm_velocity" in gesture_data
+    if motion:
+        flags |= FLAG_MOTION
+    dtype = "<f4" if precision == 32 else "<f2"
+
+    parts = [_HEADER.pack(b"GC", COMPACT_VERSION, flags, hands, len(gestures))]
+
+    if hands:
+        per_hand = np.empty((hands, _FLOATS_PER_HAND), dtype=np.float32)
+        per_hand[:, :63] = np.asarray(gesture_data["landmarks"], dtype=np.float32).reshape(hands, 63)
+        per_hand[:, 63:66] = gesture_data["palm_center"]
+        per_hand[:, 66:70] = [
+            [box["x_min"], box["y_min"], box["x_max"], box["y_max"]]
+            for box in gesture_data["bounding_boxes"]
+        ]
+        parts.append(per_hand.astype(dtype).tobytes())
+
+    for gesture in gestures:
+        parts.append(bytes((
+            GESTURE_CODES.get(gesture["type"], 0),
+            _quantize(gesture["confidence"]),
+            DIRECTION_CODES.get(gesture.get("direction", ""), 0),
+            _quantize(gesture.get("scale", 0.0)),
+            min(255, gesture.get("hands", 0))
+        )))
+
+    if motion:
+        palm_velocity = np.asarray(gesture_data["palm_velocity"], dtype=np.float32).reshape(hands, _MOTION_PER_HAND)
+        per_gesture = np.full((len(gestures), _MOTION_PER_GESTURE), np.nan, dtype=np.float32)
+        for index, gesture in enumerate(gestures):
+            if "velocity" in gesture:
+                per_gesture[index, :2] = gesture["velocity"]
+            if "angular_velocity" in gesture:
+                per_gesture[index, 2] = gesture["angular_velocity"]
+        parts.append(palm_velocity.astype(dtype).tobytes())
+        parts.append(per_gesture.astype(dtype).tobytes())
+
+    return b"".join(parts)
+
+
+def decode_compact(payload: bytes) -> Dict:
+    """Unpack the compact format back into the JSON result shape"""
+    magic, version, flags, hands, gesture_count = _HEADER.unpack_from(payload)
+    if magic != b"GC" or version != COMPACT_VERSION:
+        raise ValueError("Not a compact gesture payload")
+
+    dtype = np.dtype("<f4" if flags & FLAG_FLOAT32 else "<f2")
+    offset = _HEADER.size
+    per_hand = np.frombuffer(payload, dtype=dtype, count=hands * _FLOATS_PER_HAND, offset=offset)
+    per_hand = per_hand.reshape(hands, _FLOATS_PER_HAND).astype(np.float32)
+    offset += per_hand.size * dtype.itemsize
+
+    landmarks = per_hand[:, :63].reshape(hands, 21, 3)
+    gestures: List[Dict] = []
+    for index in range(gesture_count):
+        start = offset + _GESTURE_SIZE * index
+        code, confidence, direction, scale, gesture_hands = payload[start:start + _GESTURE_SIZE]
+        gesture = {"type": GESTURE_TYPES[code], "confidence": confidence / 255}
+        if direction:
+            gesture["direction"] = DIRECTIONS[direction]
+        if GESTURE_TYPES[code] == "zoom":
+            gesture["scale"] = scale / 255
+        if gesture_hands:
+            gesture["hands"] = gesture_hands
+        gestures.append(gesture)
+    offset += _GESTURE_SIZE * gesture_count
+
+    motion = {}
+    if flags & FLAG_MOTION:
+        count = hands * _MOTION_PER_HAND + gesture_count * _MOTION_PER_GESTURE
+        values = np.frombuffer(payload, dtype=dtype, count=count, offset=offset).astype(np.float32)
+        motion["palm_velocity"] = values[:hands * _MOTION_PER_HAND].reshape(hands, _MOTION_PER_HAND).tolist()
+        per_gesture = values[hands * _MOTION_PER_HAND:].reshape(gesture_count, _MOTION_PER_GESTURE).tolist()
+        for gesture, (velocity_x, velocity_y, angular_velocity) in zip(gestures, per_gesture):
+            if not np.isnan(velocity_x):
+                gesture["velocity"] = [velocity_x, velocity_y]
+            if not np.isnan(angular_velocity):
+                gesture["angular_velocity"] = angular_velocity
+
+    return dict({
+        "hands_detected": hands,
+        "landmarks": landmarks.tolist(),
+        "gestures": gestures,
+        "bounding_boxes": [
+            {"x_min": x0, "y_min": y0, "x_max": x1, "y_max": y1, "width": x1 - x0, "height": y1 - y0}
+            for x0, y0, x1, y1 in per_hand[:, 66:70].tolist()
+        ],
+        "fingertip_positions": [
+            dict(zip(("thumb", "index", "middle", "ring", "pinky"), hand[4::4].tolist()))
+            for hand in landmarks
+        ],
+        "palm_center": per_hand[:, 63:66].tolist(),
+        "gesture_scores": {},
+        "stale": bool(flags & FLAG_STALE)
+    }, **motion)
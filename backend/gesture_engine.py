@@ -1,25 +1,232 @@
-import cv2
-import mediapipe as mp
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import math
+import struct
+import time
 
-class GestureRecognizer:
-    def __init__(self):
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
-            max_num_hands=2,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
-        )
-        self.mp_draw = mp.solutions.drawing_utils
+# OpenCV and MediaPipe are imported where they are first used, so processes
+# that only classify landmarks (or never see a gesture) do not pay for them.
+
+# Raw pixel layouts: bytes per pixel, and the colour order the decoded frame
+# is left in. Raw frames are never converted to BGR only to be converted
+# back to RGB for MediaPipe.
+RAW_FRAME_FORMATS = {
+    "bgr": (3, "bgr"),
+    "rgb": (3, "rgb"),
+    "rgba": (4, "rgb"),
+    "i420": (1.5, "rgb"),
+    "nv12": (1.5, "rgb"),
+    "nv21": (1.5, "rgb")
+}
+# cv2 conversion code names, resolved when a YUV frame is decoded
+YUV_TO_RGB = {
+    "i420": "COLOR_YUV2RGB_I420",
+    "nv12": "COLOR_YUV2RGB_NV12",
+    "nv21": "COLOR_YUV2RGB_NV21"
+}
+
+def frame_color_order(frame_format: str) -> str:
+    """Colour order ("bgr" or "rgb") of frames returned by decode_frame for a format"""
+    return RAW_FRAME_FORMATS.get(frame_format, (0, "bgr"))[1]
+
+def decode_frame(data: bytes, frame_format: str = "jpeg", width: Optional[int] = None,
+                 height: Optional[int] = None) -> Optional[np.ndarray]:
+    """Decode an encoded image or a raw pixel buffer into a frame.
+    
+    Encoded images come back as BGR. Raw buffers are viewed in place with
+    np.frombuffer (no copy) and come back in the order given by
+    frame_color_order: bgr and rgb need no conversion at all, while rgba and
+    the YUV layouts are converted straight to RGB.
+    """
+    import cv2
+    buffer = np.frombuffer(data, np.uint8)
+    # cv2.imdecode raises on an empty buffer rather than failing to decode it
+    if not buffer.size:
+        return None
+    
+    if frame_format == "jpeg":
+        # Any format cv2 can sniff (JPEG, PNG, WebP) goes through imdecode
+        return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    
+    layout = RAW_FRAME_FORMATS.get(frame_format)
+    if layout is None or not isinstance(width, int) or not isinstance(height, int) or width <= 0 or height <= 0:
+        return None
+    # 4:2:0 chroma is subsampled 2x2, so YUV layouts only exist at even sizes
+    if frame_format in YUV_TO_RGB and (width % 2 or height % 2):
+        return None
+    if buffer.size != int(width * height * layout[0]):
+        return None
+    
+    if frame_format in YUV_TO_RGB:
+        # Planar/semi-planar 4:2:0 is height * 3/2 rows of single bytes
+        return cv2.cvtColor(buffer.reshape(height * 3 // 2, width), getattr(cv2, YUV_TO_RGB[frame_format]))
+    
+    frame = buffer.reshape(height, width, layout[0])
+    if frame_format == "rgba":
+        return cv2.cvtColor(frame, cv2.COLOR_RGBA2RGB)
+    return frame
+
+def unpack_frames(body: bytes) -> List[bytes]:
+    """Split a packed batch body: each frame is a little-endian uint32 length then its bytes"""
+    frames = []
+    offset = 0
+    while offset < len(body):
+        if offset + 4 > len(body):
+            raise ValueError("Truncated frame length")
+        (length,) = struct.unpack_from("<I", body, offset)
+        offset += 4
+        if offset + length > len(body):
+            raise ValueError("Truncated frame data")
+        frames.append(body[offset:offset + length])
+        offset += length
+    return frames
+
+def split_frame_timestamp(data: bytes) -> Tuple[float, bytes]:
+    """Split a timestamped stream frame: a little-endian float64 capture time in ms, then the frame"""
+    if len(data) < 8:
+        raise ValueError("Frame is too short to carry a timestamp")
+    (captured_ms,) = struct.unpack_from("<d", data)
+    if not math.isfinite(captured_ms):
+        raise ValueError("Frame timestamp is not a finite number")
+    return captured_ms / 1000, data[8:]
+
+def build_gesture_timeline(results: List[Dict]) -> List[Dict]:
+    """Collapse per-frame gestures into runs of consecutive frames per gesture type"""
+    timeline = []
+    open_runs: Dict[str, Dict] = {}
+    
+    for index, result in enumerate(results):
+        confidences: Dict[str, float] = {}
+        for gesture in result.get("gestures", []):
+            confidences[gesture["type"]] = max(confidences.get(gesture["type"], 0.0), gesture["confidence"])
         
-    def process_frame(self, frame: np.ndarray) -> Dict:
-        """Process frame and detect hand gestures for all game types"""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(rgb_frame)
+        # Close runs whose gesture disappeared in this frame
+        for gesture_type in list(open_runs):
+            if gesture_type not in confidences:
+                timeline.append(open_runs.pop(gesture_type))
         
+        for gesture_type, confidence in confidences.items():
+            run = open_runs.get(gesture_type)
+            if run is None:
+                open_runs[gesture_type] = {
+                    "type": gesture_type,
+                    "start_frame": index,
+                    "end_frame": index,
+                    "peak_confidence": confidence
+                }
+            else:
+                run["end_frame"] = index
+                run["peak_confidence"] = max(run["peak_confidence"], confidence)
+    
+    timeline.extend(open_runs.values())
+    timeline.sort(key=lambda run: (run["start_frame"], run["type"]))
+    return timeline
+
+MAX_HANDS = 2
+LANDMARK_RECORD_BYTES = 21 * 3 * 4
+
+def decode_landmarks(data: bytes) -> Optional[np.ndarray]:
+    """Read packed little-endian float32 landmarks (hands x 21 x 3) sent by a client"""
+    if len(data) % LANDMARK_RECORD_BYTES or len(data) // LANDMARK_RECORD_BYTES > MAX_HANDS:
+        return None
+    return np.frombuffer(data, dtype="<f4").reshape(-1, 21, 3)
+
+def landmarks_from_lists(hands: List[List[List[float]]]) -> Optional[np.ndarray]:
+    """Validate JSON landmark lists into a (hands, 21, 3) float32 array"""
+    try:
+        landmarks = np.asarray(hands, dtype=np.float32).reshape(-1, 21, 3)
+    except (ValueError, TypeError):
+        return None
+    if len(landmarks) > MAX_HANDS:
+        return None
+    return landmarks
+
+# MediaPipe hand landmark indices; fingertips (4, 8, ..., 20) and the palm
+# MCPs (5, 9, 13, 17) are evenly strided, so they are gathered with slices
+WRIST = 0
+INDEX_PIP = 6
+INDEX_TIP = 8
+MIDDLE_MCP = 9
+FINGERTIPS = ("thumb", "index", "middle", "ring", "pinky")
+FINGERTIP_SLICE = slice(4, 21, 4)
+PALM_MCP_SLICE = slice(5, 18, 4)
+
+def landmarks_to_array(multi_hand_landmarks) -> np.ndarray:
+    """Copy MediaPipe hand landmarks into a (hands, 21, 3) float32 array"""
+    if not multi_hand_landmarks:
+        return np.empty((0, 21, 3), dtype=np.float32)
+    
+    return np.array(
+        [[(lm.x, lm.y, lm.z) for lm in hand.landmark] for hand in multi_hand_landmarks],
+        dtype=np.float32
+    )
+
+def extract_hand_features(landmarks: np.ndarray) -> Dict[str, np.ndarray]:
+    """Compute every per-hand feature the gesture classifiers use in one vectorized pass.
+    
+    ``landmarks`` is a (hands, 21, 3) array; every returned array has the hand
+    axis first so any number of hands (or frames) is scored together.
+    """
+    hands = len(landmarks)
+    fingertips = landmarks[:, FINGERTIP_SLICE]
+    tips = fingertips[:, :, :2]
+    
+    # Thumb to index and middle fingertip distances: (hands, 2)
+    thumb_offsets = tips[:, 1:3] - tips[:, :1]
+    thumb_distances = np.sqrt((thumb_offsets * thumb_offsets).sum(axis=-1))
+    
+    # Widest pairwise gap between the four fingers, excluding the thumb
+    fingers = tips[:, 1:]
+    finger_offsets = fingers[:, :, None] - fingers[:, None]
+    finger_spread = np.sqrt((finger_offsets * finger_offsets).sum(axis=-1).reshape(hands, -1).max(axis=1))
+    
+    # Wrist -> middle finger MCP gives the hand's tilt
+    wrist_to_middle = landmarks[:, MIDDLE_MCP, :2] - landmarks[:, WRIST, :2]
+    tilt_angle = np.degrees(np.arctan2(wrist_to_middle[:, 1], wrist_to_middle[:, 0]))
+    
+    # Palm center is the mean of the wrist and the four finger MCPs
+    palm_center = (landmarks[:, WRIST] + landmarks[:, PALM_MCP_SLICE].sum(axis=1)) / 5
+    
+    xy = landmarks[:, :, :2]
+    
+    return {
+        "thumb_index_distance": thumb_distances[:, 0],
+        "thumb_middle_distance": thumb_distances[:, 1],
+        "finger_spread": finger_spread,
+        "index_extended": landmarks[:, INDEX_TIP, 1] < landmarks[:, INDEX_PIP, 1],
+        "tilt_angle": tilt_angle,
+        "fingertips": fingertips,
+        "palm_center": palm_center,
+        "bbox_min": xy.min(axis=1),
+        "bbox_max": xy.max(axis=1),
+        "landmarks": landmarks
+    }
+
+class GestureClassifier:
+    """Turns hand landmarks into gesture results for all game types.
+    
+    Holds no vision state, so it can classify landmarks that were produced
+    anywhere; GestureRecognizer feeds it landmarks from MediaPipe.
+    
+    By default each hand runs through the hand-written threshold rules. With
+    ``templates`` (the path of a gesture_templates library) hands are matched
+    against recorded template poses instead, so new gestures need data, not
+    code.
+    """
+    
+    def __init__(self, templates: Optional[str] = None):
+        self.templates = None
+        if templates:
+            # Imported here because gesture_templates builds on this module's constants
+            from gesture_templates import load_templates
+            self.templates = load_templates(templates)
+    
+    def classify_landmarks(self, landmarks: np.ndarray, tracker=None) -> Dict:
+        """Build the gesture payload for a (hands, 21, 3) landmark array.
+        
+        ``tracker`` is an optional gesture_temporal.TemporalTracker that has
+        already seen these landmarks; it adds motion-based gestures.
+        """
         gesture_data = {
             "hands_detected": 0,
             "landmarks": [],
@@ -30,196 +237,366 @@ class GestureRecognizer:
             "gesture_scores": {}
         }
         
-        if results.multi_hand_landmarks:
-            gesture_data["hands_detected"] = len(results.multi_hand_landmarks)
+        if len(landmarks) == 0:
+            return gesture_data
+        
+        features = extract_hand_features(landmarks)
+        gestures_per_hand = self._classify_all_gestures(features)
+        if tracker is not None:
+            tracker.annotate(gestures_per_hand, gesture_data)
+        
+        gesture_data["hands_detected"] = len(landmarks)
+        gesture_data["landmarks"] = landmarks.tolist()
+        
+        for hand_gestures in gestures_per_hand:
+            # Detect multiple gesture types
+            gesture_data["gestures"].extend(hand_gestures)
+        
+        # Get fingertip positions for precise control
+        gesture_data["fingertip_positions"] = self._get_fingertip_positions(features)
+        
+        # Get palm center for movement detection
+        gesture_data["palm_center"] = self._get_palm_center(features)
+        
+        # Calculate bounding box
+        gesture_data["bounding_boxes"] = self._get_bounding_box(features)
+        
+        return gesture_data
+    
+    def _classify_all_gestures(self, features: Dict[str, np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """Classify multiple gesture types for different games, for every hand at once"""
+        if self.templates is not None:
+            return self._match_templates(features)
+        
+        # Convert each feature column to Python scalars once rather than per gesture
+        columns = zip(
+            features["thumb_index_distance"].tolist(),
+            features["thumb_middle_distance"].tolist(),
+            features["finger_spread"].tolist(),
+            features["index_extended"].tolist(),
+            features["tilt_angle"].tolist()
+        )
+        
+        gestures_per_hand = []
+        for thumb_index, thumb_middle, spread, index_extended, tilt_angle in columns:
+            gestures = []
+            
+            # Drag and drop gesture (for Physics & Coding): thumb pinched to index and middle
+            drag_confidence = 0.9 if thumb_index < 0.05 and thumb_middle < 0.06 else 0.0
+            if drag_confidence > 0.8:
+                gestures.append({"type": "drag", "confidence": drag_confidence})
+            
+            # Shape drawing gesture (for Math): index tip above its PIP joint
+            draw_confidence = 0.8 if index_extended else 0.0
+            if draw_confidence > 0.7:
+                gestures.append({"type": "draw", "confidence": draw_confidence})
+            
+            # Pour/tilt gesture (for Chemistry): significant wrist-to-MCP tilt
+            pour_confidence = 0.8 if abs(tilt_angle) > 30 else 0.0
+            if pour_confidence > 0.75:
+                # Wrist left of the middle MCP means the hand leans left
+                direction = "left" if abs(tilt_angle) < 90 else "right"
+                gestures.append({"type": "pour", "confidence": pour_confidence, "direction": direction})
             
-            for hand_landmarks in results.multi_hand_landmarks:
-                landmarks = []
-                for lm in hand_landmarks.landmark:
-                    landmarks.append([lm.x, lm.y, lm.z])
-                
-                gesture_data["landmarks"].append(landmarks)
-                
-                # Detect multiple gesture types
-                gestures = self._classify_all_gestures(landmarks)
-                gesture_data["gestures"].extend(gestures)
-                
-                # Get fingertip positions for precise control
-                fingertips = self._get_fingertip_positions(landmarks)
-                gesture_data["fingertip_positions"].append(fingertips)
-                
-                # Get palm center for movement detection
-                palm_center = self._get_palm_center(landmarks)
-                gesture_data["palm_center"].append(palm_center)
-                
-                # Calculate bounding box
-                bbox = self._get_bounding_box(landmarks)
-                gesture_data["bounding_boxes"].append(bbox)
+            # Rotate/zoom gesture (for Biology): fingers spread. A single frame
+            # cannot show rotation; TemporalTracker detects it from motion
+            rotate_confidence = 0.7 if spread > 0.15 else 0.0
+            if rotate_confidence > 0.7:
+                gestures.append({"type": "rotate", "confidence": rotate_confidence})
+            
+            # Pinch zoom gesture: very close to zoom in, spread to zoom out
+            if thumb_index < 0.03:
+                zoom_confidence = 0.9
+            elif thumb_index > 0.15:
+                zoom_confidence = 0.8
+            else:
+                zoom_confidence = 0.0
+            if zoom_confidence > 0.7:
+                # Normalize to 0-1 scale
+                scale = max(0, min(1, (thumb_index - 0.03) / 0.12))
+                gestures.append({"type": "zoom", "confidence": zoom_confidence, "scale": scale})
+            
+            gestures_per_hand.append(gestures)
+        
+        return gestures_per_hand
+    
+    def _match_templates(self, features: Dict[str, np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """One nearest-neighbour lookup for all hands, plus the parameters games expect"""
+        gestures_per_hand = []
+        matches = self.templates.classify(features["landmarks"])
+        for hand, match in enumerate(matches):
+            if match is None:
+                gestures_per_hand.append([])
+                continue
+            
+            label, confidence = match
+            gesture = {"type": label, "confidence": confidence}
+            if label == "pour":
+                gesture["direction"] = "left" if abs(float(features["tilt_angle"][hand])) < 90 else "right"
+            elif label == "zoom":
+                distance = float(features["thumb_index_distance"][hand])
+                gesture["scale"] = max(0, min(1, (distance - 0.03) / 0.12))
+            gestures_per_hand.append([gesture])
+        return gestures_per_hand
+    
+    def _get_fingertip_positions(self, features: Dict[str, np.ndarray]) -> List[Dict[str, List[float]]]:
+        """Get precise fingertip positions for every hand"""
+        return [dict(zip(FINGERTIPS, tips)) for tips in features["fingertips"].tolist()]
+    
+    def _get_palm_center(self, features: Dict[str, np.ndarray]) -> List[List[float]]:
+        """Calculate palm center position for every hand"""
+        return features["palm_center"].tolist()
+    
+    def _get_bounding_box(self, features: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+        """Get bounding box around every hand"""
+        boxes = []
+        for (x_min, y_min), (x_max, y_max) in zip(features["bbox_min"].tolist(), features["bbox_max"].tolist()):
+            boxes.append({
+                "x_min": x_min,
+                "y_min": y_min,
+                "x_max": x_max,
+                "y_max": y_max,
+                "width": x_max - x_min,
+                "height": y_max - y_min
+            })
+        return boxes
+
+def warm_up_recognizer(factory=None):
+    """Build a recognizer and run one blank frame through it, then discard it.
+    
+    Importing MediaPipe and loading its models takes seconds; doing it here
+    means the first student's frame does not pay for it.
+    """
+    recognizer = (factory or GestureRecognizer)()
+    try:
+        recognizer.process_frame(np.zeros((240, 320, 3), dtype=np.uint8))
+    finally:
+        recognizer.close()
+
+class MotionGate:
+    """Cheap scene-change detector placed in front of hand inference.
+    
+    Frames are shrunk to a tiny grayscale thumbnail and compared with the
+    thumbnail of the last frame that was actually processed. A thumbnail
+    pixel counts as changed when it moved by more than ``pixel_threshold``
+    grey levels; if fewer than ``threshold`` (a fraction) of them changed,
+    the scene is considered still. At most ``max_skips`` frames in a row are
+    skipped so slow drifts are still picked up.
+    """
+    
+    def __init__(self, threshold: float = 0.005, max_skips: int = 10, pixel_threshold: int = 12,
+                 size: Tuple[int, int] = (32, 24)):
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self._reference: Optional[np.ndarray] = None
+        self._skipped_in_row = 0
+        self.counts = {"motion_processed": 0, "motion_skipped": 0}
+    
+    def changed(self, frame: np.ndarray, color_order: str = "bgr") -> bool:
+        """Return False when the frame can reuse the previous result"""
+        import cv2
+        to_gray = cv2.COLOR_RGB2GRAY if color_order == "rgb" else cv2.COLOR_BGR2GRAY
+        thumbnail = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), to_gray)
+        
+        if self._reference is not None and self._skipped_in_row < self.max_skips:
+            changed_fraction = np.count_nonzero(cv2.absdiff(thumbnail, self._reference) > self.pixel_threshold) / thumbnail.size
+            if changed_fraction < self.threshold:
+                self._skipped_in_row += 1
+                self.counts["motion_skipped"] += 1
+                return False
+        
+        self._reference = thumbnail
+        self._skipped_in_row = 0
+        self.counts["motion_processed"] += 1
+        return True
+
+class GestureRecognizer(GestureClassifier):
+    """Runs MediaPipe Hands on camera frames and classifies the result.
+    
+    Inference is adaptive: once a hand has been found, later frames are
+    cropped to an expanded region around the previous bounding boxes, and
+    every image handed to MediaPipe is downscaled so its longest side is at
+    most ``inference_size`` pixels. The crop is only re-centred when a hand
+    drifts towards its edge, which keeps MediaPipe's tracker working in a
+    stable coordinate frame. If no hand is found inside the crop the frame is
+    searched again in full. ``path_counts`` records how often each path ran.
+    
+    With a ``motion_threshold`` above zero, a MotionGate sits in front of all
+    of this and frames whose scene has not changed get the previous result
+    back, marked ``"stale": True``.
+    
+    With ``temporal`` enabled, landmarks are smoothed by a per-recognizer
+    TemporalTracker before classification, which also adds motion gestures.
+    
+    ``last_timings`` holds the seconds spent in each stage of the most recent
+    frame, for the caller to feed into metrics, and ``last_landmarks`` and
+    ``last_timestamp`` the landmarks and capture time of the most recent
+    frame that actually ran inference.
+    """
+    
+    def __init__(self, inference_size: int = 320, roi_margin: float = 0.5, min_roi_size: float = 0.3,
+                 motion_threshold: float = 0.005, motion_max_skips: int = 10, temporal: bool = True,
+                 templates: Optional[str] = None):
+        import mediapipe as mp
+        
+        super().__init__(templates)
+        self.mp_hands = mp.solutions.hands
+        self.hands = self.mp_hands.Hands(
+            static_image_mode=False,
+            max_num_hands=2,
+            min_detection_confidence=0.7,
+            min_tracking_confidence=0.5
+        )
+        self.mp_draw = mp.solutions.drawing_utils
+        
+        self.inference_size = inference_size
+        self.roi_margin = roi_margin
+        self.min_roi_size = min_roi_size
+        self._roi: Optional[Tuple[float, float, float, float]] = None
+        self.path_counts = {"roi": 0, "full": 0, "roi_lost": 0}
+        
+        self.motion_gate = MotionGate(motion_threshold, motion_max_skips) if motion_threshold > 0 else None
+        self._last_result: Optional[Dict] = None
+        self.last_timings: Dict[str, float] = {}
+        self.last_landmarks = np.empty((0, 21, 3), dtype=np.float32)
+        self.last_timestamp = 0.0
+        
+        # Imported here because gesture_temporal builds on this module's constants
+        from gesture_temporal import TemporalTracker
+        self.tracker = TemporalTracker() if temporal else None
+        
+    def close(self):
+        """Release the MediaPipe graph held by this recognizer"""
+        self.hands.close()
+        
+    def counters(self) -> Dict[str, int]:
+        """Inference path and motion gate counts for this recognizer"""
+        counts = dict(self.path_counts)
+        if self.motion_gate is not None:
+            counts.update(self.motion_gate.counts)
+        return counts
+        
+    def process_frame(self, frame: np.ndarray, color_order: str = "bgr", timestamp: Optional[float] = None) -> Dict:
+        """Process frame and detect hand gestures for all game types.
+        
+        ``timestamp`` is when the frame was captured, in time.monotonic()
+        seconds, and defaults to now. The temporal tracker measures motion
+        against it, so frames that were queued and then processed in a burst
+        must pass it to be smoothed at their real spacing.
+        """
+        self.last_timings = {}
+        
+        if self.motion_gate is not None:
+            start = time.perf_counter()
+            changed = self.motion_gate.changed(frame, color_order)
+            self._record_stage("motion_gate", start)
+            if not changed and self._last_result is not None:
+                return dict(self._last_result, stale=True)
+        
+        landmarks = None
+        
+        if self._roi is not None:
+            landmarks = self._detect_hands(frame, color_order, self._roi)
+            if len(landmarks):
+                self.path_counts["roi"] += 1
+            else:
+                # Tracking lost inside the crop: fall back to a full-frame search
+                self.path_counts["roi_lost"] += 1
+                landmarks = None
+        
+        if landmarks is None:
+            landmarks = self._detect_hands(frame, color_order, None)
+            self.path_counts["full"] += 1
+            self._roi = None
         
+        self._update_roi(landmarks)
+        self.last_landmarks = landmarks
+        self.last_timestamp = time.monotonic() if timestamp is None else timestamp
+        
+        start = time.perf_counter()
+        if self.tracker is not None:
+            landmarks = self.tracker.update(landmarks, self.last_timestamp)
+        gesture_data = self.classify_landmarks(landmarks, self.tracker)
+        self._record_stage("classify", start)
+        gesture_data["stale"] = False
+        self._last_result = gesture_data
         return gesture_data
     
-    def _classify_all_gestures(self, landmarks: List[List[float]]) -> List[Dict[str, Any]]:
-        """Classify multiple gesture types for different games"""
-        gestures = []
-        
-        # Drag and drop gesture (for Physics & Coding)
-        drag_confidence = self._detect_drag_gesture(landmarks)
-        if drag_confidence > 0.8:
-            gestures.append({"type": "drag", "confidence": drag_confidence})
-        
-        # Shape drawing gesture (for Math)
-        draw_confidence = self._detect_draw_gesture(landmarks)
-        if draw_confidence > 0.7:
-            gestures.append({"type": "draw", "confidence": draw_confidence})
-        
-        # Pour/tilt gesture (for Chemistry)
-        pour_confidence = self._detect_pour_gesture(landmarks)
-        if pour_confidence > 0.75:
-            gestures.append({"type": "pour", "confidence": pour_confidence, "direction": self._get_tilt_direction(landmarks)})
-        
-        # Rotate/zoom gesture (for Biology)
-        rotate_confidence = self._detect_rotate_gesture(landmarks)
-        if rotate_confidence > 0.7:
-            gestures.append({"type": "rotate", "confidence": rotate_confidence})
-        
-        # Pinch zoom gesture
-        zoom_confidence = self._detect_zoom_gesture(landmarks)
-        if zoom_confidence > 0.7:
-            gestures.append({"type": "zoom", "confidence": zoom_confidence, "scale": self._get_zoom_scale(landmarks)})
-        
-        return gestures
-    
-    def _detect_drag_gesture(self, landmarks: List[List[float]]) -> float:
-        """Detect grab/drag gesture for physics and coding games"""
-        thumb_tip = landmarks[4]
-        index_tip = landmarks[8]
-        middle_tip = landmarks[12]
-        
-        # Check if thumb and fingers are close together (pinch)
-        thumb_index_dist = self._calculate_distance(thumb_tip, index_tip)
-        thumb_middle_dist = self._calculate_distance(thumb_tip, middle_tip)
-        
-        if thumb_index_dist < 0.05 and thumb_middle_dist < 0.06:
-            return 0.9
-        return 0.0
-    
-    def _detect_draw_gesture(self, landmarks: List[List[float]]) -> float:
-        """Detect drawing gesture for math shapes"""
-        index_tip = landmarks[8]
-        index_pip = landmarks[6]  # PIP joint
-        
-        # Check if index finger is extended for drawing
-        if index_tip[1] < index_pip[1]:  # Tip above PIP (extended)
-            return 0.8
-        return 0.0
-    
-    def _detect_pour_gesture(self, landmarks: List[List[float]]) -> float:
-        """Detect pouring gesture for chemistry"""
-        wrist = landmarks[0]
-        middle_mcp = landmarks[9]  # Middle finger MCP
-        
-        # Check hand tilt based on wrist to middle finger relationship
-        tilt_angle = self._calculate_tilt_angle(wrist, middle_mcp)
-        
-        if abs(tilt_angle) > 30:  # Significant tilt
-            return 0.8
-        return 0.0
-    
-    def _detect_rotate_gesture(self, landmarks: List[List[float]]) -> float:
-        """Detect rotation gesture for biology 3D models"""
-        # Check if hand is making circular motion (simplified)
-        # In practice, you'd track motion over multiple frames
-        fingertips = [landmarks[i] for i in [8, 12, 16, 20]]
-        spread = self._calculate_finger_spread(fingertips)
-        
-        if spread > 0.15:  # Fingers spread for rotation
-            return 0.7
-        return 0.0
-    
-    def _detect_zoom_gesture(self, landmarks: List[List[float]]) -> float:
-        """Detect pinch-to-zoom gesture"""
-        thumb_tip = landmarks[4]
-        index_tip = landmarks[8]
-        
-        distance = self._calculate_distance(thumb_tip, index_tip)
-        
-        if distance < 0.03:  # Very close for zoom
-            return 0.9
-        elif distance > 0.15:  # Spread for zoom out
-            return 0.8
-        return 0.0
-    
-    def _get_fingertip_positions(self, landmarks: List[List[float]]) -> Dict[str, List[float]]:
-        """Get precise fingertip positions"""
-        return {
-            "thumb": landmarks[4],
-            "index": landmarks[8],
-            "middle": landmarks[12],
-            "ring": landmarks[16],
-            "pinky": landmarks[20]
-        }
+    def _detect_hands(self, frame: np.ndarray, color_order: str,
+                      roi: Optional[Tuple[float, float, float, float]]) -> np.ndarray:
+        """Run MediaPipe on a (cropped, downscaled) view and return full-frame landmarks"""
+        import cv2
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = 0, 0, width, height
+        if roi is not None:
+            x0, y0 = int(roi[0] * width), int(roi[1] * height)
+            x1, y1 = int(math.ceil(roi[2] * width)), int(math.ceil(roi[3] * height))
+        
+        crop = frame[y0:y1, x0:x1]
+        crop_height, crop_width = crop.shape[:2]
+        
+        # Downscale before colour conversion so both run on fewer pixels
+        start = time.perf_counter()
+        scale = self.inference_size / max(crop_height, crop_width)
+        if scale < 1:
+            crop = cv2.resize(crop, (max(1, round(crop_width * scale)), max(1, round(crop_height * scale))),
+                              interpolation=cv2.INTER_AREA)
+        self._record_stage("resize", start)
+        
+        start = time.perf_counter()
+        if color_order == "bgr":
+            rgb_frame = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        else:
+            # Already RGB: only a cropped view needs copying into contiguous memory
+            rgb_frame = np.ascontiguousarray(crop)
+        self._record_stage("cvt_color", start)
+        
+        start = time.perf_counter()
+        results = self.hands.process(rgb_frame)
+        landmarks = landmarks_to_array(results.multi_hand_landmarks)
+        self._record_stage("hands_process", start)
+        
+        if roi is not None and len(landmarks):
+            # Map crop-normalized coordinates back onto the full frame; MediaPipe's
+            # z shares the x axis scale, so it shrinks with the crop width
+            landmarks[..., 0] = (x0 + landmarks[..., 0] * crop_width) / width
+            landmarks[..., 1] = (y0 + landmarks[..., 1] * crop_height) / height
+            landmarks[..., 2] *= crop_width / width
+        
+        return landmarks
     
-    def _get_palm_center(self, landmarks: List[List[float]]) -> List[float]:
-        """Calculate palm center position"""
-        palm_points = [landmarks[0], landmarks[5], landmarks[9], landmarks[13], landmarks[17]]
-        x_coords = [p[0] for p in palm_points]
-        y_coords = [p[1] for p in palm_points]
-        z_coords = [p[2] for p in palm_points]
-        
-        return [
-            sum(x_coords) / len(x_coords),
-            sum(y_coords) / len(y_coords),
-            sum(z_coords) / len(z_coords)
-        ]
-    
-    def _get_bounding_box(self, landmarks: List[List[float]]) -> Dict[str, float]:
-        """Get bounding box around hand"""
-        x_coords = [lm[0] for lm in landmarks]
-        y_coords = [lm[1] for lm in landmarks]
-        
-        return {
-            "x_min": min(x_coords),
-            "y_min": min(y_coords),
-            "x_max": max(x_coords),
-            "y_max": max(y_coords),
-            "width": max(x_coords) - min(x_coords),
-            "height": max(y_coords) - min(y_coords)
-        }
+    def _record_stage(self, stage: str, start: float):
+        # A lost ROI runs detection twice, so stages accumulate within a frame
+        self.last_timings[stage] = self.last_timings.get(stage, 0.0) + time.perf_counter() - start
     
-    def _get_tilt_direction(self, landmarks: List[List[float]]) -> str:
-        """Get direction of hand tilt for pouring"""
-        wrist = landmarks[0]
-        middle_mcp = landmarks[9]
+    def _update_roi(self, landmarks: np.ndarray):
+        """Keep, re-centre or drop the crop region based on where the hands are now"""
+        if not len(landmarks):
+            self._roi = None
+            return
+        
+        xy = landmarks[:, :, :2]
+        hx0, hy0 = xy.min(axis=(0, 1)).tolist()
+        hx1, hy1 = xy.max(axis=(0, 1)).tolist()
+        
+        if self._roi is not None:
+            # Keep the current crop while the hands stay clear of its outer band
+            rx0, ry0, rx1, ry1 = self._roi
+            band_x = (rx1 - rx0) * self.roi_margin / (2 * (1 + 2 * self.roi_margin))
+            band_y = (ry1 - ry0) * self.roi_margin / (2 * (1 + 2 * self.roi_margin))
+            if hx0 > rx0 + band_x and hy0 > ry0 + band_y and hx1 < rx1 - band_x and hy1 < ry1 - band_y:
+                return
+        
+        # Expand the hands' box by the margin on every side, with a floor on size
+        half_w = max((hx1 - hx0) * (0.5 + self.roi_margin), self.min_roi_size / 2)
+        half_h = max((hy1 - hy0) * (0.5 + self.roi_margin), self.min_roi_size / 2)
+        cx, cy = (hx0 + hx1) / 2, (hy0 + hy1) / 2
+        roi = (max(0.0, cx - half_w), max(0.0, cy - half_h), min(1.0, cx + half_w), min(1.0, cy + half_h))
         
-        if wrist[0] < middle_mcp[0]:
-            return "left"
+        # A crop that covers most of the frame saves nothing over the full search
+        if (roi[2] - roi[0]) * (roi[3] - roi[1]) > 0.8:
+            self._roi = None
         else:
-            return "right"
-    
-    def _get_zoom_scale(self, landmarks: List[List[float]]) -> float:
-        """Calculate zoom scale based on finger distance"""
-        thumb_tip = landmarks[4]
-        index_tip = landmarks[8]
-        distance = self._calculate_distance(thumb_tip, index_tip)
-        
-        # Normalize to 0-1 scale
-        return max(0, min(1, (distance - 0.03) / 0.12))
-    
-    def _calculate_distance(self, point1: List[float], point2: List[float]) -> float:
-        """Calculate Euclidean distance between two points"""
-        return math.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
-    
-    def _calculate_tilt_angle(self, point1: List[float], point2: List[float]) -> float:
-        """Calculate tilt angle between two points"""
-        dx = point2[0] - point1[0]
-        dy = point2[1] - point1[1]
-        return math.degrees(math.atan2(dy, dx))
-    
-    def _calculate_finger_spread(self, fingertips: List[List[float]]) -> float:
-        """Calculate how spread out fingers are"""
-        distances = []
-        for i in range(len(fingertips)):
-            for j in range(i + 1, len(fingertips)):
-                distances.append(self._calculate_distance(fingertips[i], fingertips[j]))
-        
-        return max(distances) if distances else 0.0
\ No newline at end of file
+            self._roi = roi
@@ -0,0 +1,182 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Union
+
+from gesture_codec import encode_compact
+from gesture_engine import decode_frame, frame_color_order
+from gesture_recorder import GestureRecorder, wall_clock
+from recognizer_pool import RecognizerPool, RecognizerPoolFull
+
+logger = logging.getLogger("uvicorn.error")
+
+# Marks the end of the stream as it flows through the stages
+_STOP = object()
+
+
+class StreamPipeline:
+    """Three-stage decode -> inference -> serialize pipeline for one stream.
+
+    Each stage runs on its own thread with a small bounded queue in front of
+    it, so decoding frame N+1 overlaps MediaPipe on frame N and encoding of
+    frame N-1; OpenCV and MediaPipe release the GIL while they work. The
+    pipeline lives in the gesture worker that owns the session (see
+    inference_pool), next to the session's recognizer.
+
+    Every stage is a single FIFO thread, so everything leaves in the order it
+    was submitted, and a frame that fails in any stage is answered in its
+    place with ``{"error": ...}``. When the client outpaces inference the oldest queued
+    frame is dropped but keeps its place, and is answered there with
+    ``{"skipped": "overflow"}``; messages passed to ``send`` are answered in
+    sequence the same way.
+
+    ``emit`` is called from the serialize thread with each outgoing message
+    (a JSON string, or bytes for the compact encoding), its status, and the
+    stage timings of the frame. The status is "frame" for a frame's result,
+    "overflow" for a dropped frame and "message" for a ``send``.
+    """
+
+    def __init__(self, session_id: str, recognizers: RecognizerPool,
+                 emit: Callable[[Union[str, bytes], str, Dict[str, float]], None],
+                 precision: Optional[int] = None, queue_size: int = 2,
+                 recorder: Optional[GestureRecorder] = None):
+        self.session_id = session_id
+        self.recognizers = recognizers
+        self.emit = emit
+        self.precision = precision
+        self.queue_size = queue_size
+        self.recorder = recorder
+
+        # Items are (status, payload, timings); only "frame" items count against queue_size
+        self._pending: Deque = deque()
+        self._pending_frames = 0
+        self._pending_ready = threading.Condition()
+        self._inference_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._serialize_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._threads = [
+            threading.Thread(target=stage, name=f"gesture-{name}-{session_id}", daemon=True)
+            for name, stage in (("decode", self._decode_stage),
+                                ("inference", self._inference_stage),
+                                ("serialize", self._serialize_stage))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, data: bytes, frame_layout: Dict, timestamp: Optional[float] = None):
+        """Queue a frame without blocking, dropping the oldest queued frame if full.
+
+        ``timestamp`` is the capture time in time.monotonic() seconds and
+        defaults to now; the temporal tracker measures motion against it.
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._pending_ready:
+            if self._pending_frames >= self.queue_size:
+                for index, item in enumerate(self._pending):
+                    if item[0] == "frame":
+                        self._pending[index] = ("overflow", {"skipped": "overflow"}, {})
+                        self._pending_frames -= 1
+                        break
+            self._pending.append(("frame", (data, frame_layout, timestamp), {}))
+            self._pending_frames += 1
+            self._pending_ready.notify()
+
+    def send(self, message: Dict):
+        """Answer with a message in sequence with the results of frames submitted before it"""
+        with self._pending_ready:
+            self._pending.append(("message", message, {}))
+            self._pending_ready.notify()
+
+    def close(self):
+        """Finish frames already queued, then stop every stage thread"""
+        with self._pending_ready:
+            self._pending.append(_STOP)
+            self._pending_ready.notify()
+        for thread in self._threads:
+            thread.join()
+
+    def _next_pending(self):
+        with self._pending_ready:
+            while not self._pending:
+                self._pending_ready.wait()
+            item = self._pending.popleft()
+            if item is not _STOP and item[0] == "frame":
+                self._pending_frames -= 1
+            return item
+
+    def _decode_stage(self):
+        while True:
+            item = self._next_pending()
+            if item is _STOP:
+                self._inference_queue.put(_STOP)
+                return
+
+            status, payload, timings = item
+            if status == "frame":
+                data, frame_layout, timestamp = payload
+                try:
+                    start = time.perf_counter()
+                    frame = decode_frame(data, **frame_layout)
+                    timings["imdecode"] = time.perf_counter() - start
+                    # BGR frames are converted after MediaPipe's crop and downscale, not here
+                    color_order = frame_color_order(frame_layout.get("frame_format", "jpeg"))
+                except Exception:
+                    # Malformed client data (cv2 rejecting a buffer, a bad layout) is just an invalid frame
+                    frame, color_order = None, "rgb"
+                payload = (frame, color_order, timestamp)
+            self._inference_queue.put((status, payload, timings))
+
+    def _inference_stage(self):
+        while True:
+            item = self._inference_queue.get()
+            if item is _STOP:
+                self._serialize_queue.put(_STOP)
+                return
+
+            status, payload, timings = item
+            if status != "frame":
+                self._serialize_queue.put(item)
+                continue
+            frame, color_order, timestamp = payload
+            if frame is None:
+                self._serialize_queue.put((status, {"error": "Invalid image data"}, timings))
+                continue
+
+            try:
+                with self.recognizers.session(self.session_id) as recognizer:
+                    gesture_data = recognizer.process_frame(frame, color_order, timestamp)
+                    timings.update(recognizer.last_timings)
+                    if self.recorder is not None and not gesture_data["stale"]:
+                        self.recorder.append(self.session_id, recognizer.last_landmarks, wall_clock(timestamp))
+            except RecognizerPoolFull as e:
+                gesture_data = {"error": str(e)}
+            except Exception:
+                logger.exception("Gesture stream %s failed to process a frame", self.session_id)
+                gesture_data = {"error": "Gesture processing failed"}
+            self._serialize_queue.put((status, gesture_data, timings))
+
+    def _serialize_stage(self):
+        while True:
+            item = self._serialize_queue.get()
+            if item is _STOP:
+                return
+
+            status, gesture_data, timings = item
+            start = time.perf_counter()
+            try:
+                if self.precision is not None and status == "frame" and "error" not in gesture_data:
+                    payload = encode_compact(gesture_data, self.precision)
+                    timings["compact_encode"] = time.perf_counter() - start
+                else:
+                    payload = json.dumps(gesture_data)
+                    if status == "frame":
+                        timings["json_encode"] = time.perf_counter() - start
+            except Exception:
+                logger.exception("Gesture stream %s failed to encode a result", self.session_id)
+                payload = json.dumps({"error": "Gesture processing failed"})
+            try:
+                self.emit(payload, status, timings)
+            except Exception:
+                logger.exception("Gesture stream %s failed to emit a result", self.session_id)
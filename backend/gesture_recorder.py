@@ -0,0 +1,211 @@
+"""Opt-in landmark stream recorder and offline replay.
+
+Set ``GESTURE_RECORD_DIR`` and every non-stale frame's landmarks are
+appended to a per-session ``.gstream`` file: a 16-byte header followed by
+fixed-size little-endian records of
+
+    t          float64   wall-clock capture time in seconds
+    hands      uint8     hands detected (0-MAX_HANDS)
+    landmarks  float32   MAX_HANDS x 21 x 3, raw (unsmoothed), unused hands zeroed
+
+Fixed-size records mean a stream is read back with one np.memmap. Replay
+feeds it through the same TemporalTracker and classifier as live frames,
+at the recorded capture times, so motion gestures come out as they did live:
+
+    python gesture_recorder.py recordings/ --output replay.json
+"""
+import argparse
+import json
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from gesture_engine import MAX_HANDS, GestureClassifier, build_gesture_timeline
+from gesture_temporal import TemporalTracker
+
+STREAM_SUFFIX = ".gstream"
+STREAM_VERSION = 1
+
+RECORD_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("hands", "u1"),
+    ("landmarks", "<f4", (MAX_HANDS, 21, 3)),
+])
+
+_HEADER = struct.Struct("<8sHHI")
+_MAGIC = b"GSTREAM\x00"
+
+
+def wall_clock(monotonic_time: float) -> float:
+    """Wall-clock time of a time.monotonic() reading, for frames stamped on capture"""
+    return time.time() - (time.monotonic() - monotonic_time)
+
+
+def stream_path(directory: str, session_id: str) -> str:
+    """File for a session; the pid keeps API and worker processes from sharing one"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)[:64] or "session"
+    return os.path.join(directory, f"{safe}-{os.getpid()}{STREAM_SUFFIX}")
+
+
+class GestureRecorder:
+    """Appends landmark records to one open file per session.
+
+    At most ``max_open`` files stay open; the least recently written one is
+    closed (and reopened for append later) when that limit is reached.
+    """
+
+    def __init__(self, directory: str, max_open: int = 64):
+        self.directory = directory
+        self.max_open = max_open
+        self._files: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._record = np.zeros(1, dtype=RECORD_DTYPE)
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, session_id: str, landmarks: np.ndarray, timestamp: Optional[float] = None):
+        """Record a (hands, 21, 3) landmark array for a session"""
+        hands = min(len(landmarks), MAX_HANDS)
+        with self._lock:
+            record = self._record
+            record["t"] = time.time() if timestamp is None else timestamp
+            record["hands"] = hands
+            record["landmarks"] = 0.0
+            record["landmarks"][0, :hands] = landmarks[:hands]
+            self._file_for(session_id).write(record.tobytes())
+
+    def close_session(self, session_id: str):
+        with self._lock:
+            handle = self._files.pop(session_id, None)
+        if handle is not None:
+            handle.close()
+
+    def close(self):
+        with self._lock:
+            handles = list(self._files.values())
+            self._files.clear()
+        for handle in handles:
+            handle.close()
+
+    def _file_for(self, session_id: str):
+        handle = self._files.get(session_id)
+        if handle is not None:
+            self._files.move_to_end(session_id)
+            return handle
+
+        if len(self._files) >= self.max_open:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+
+        path = stream_path(self.directory, session_id)
+        handle = open(path, "ab")
+        if handle.tell() == 0:
+            handle.write(_HEADER.pack(_MAGIC, STREAM_VERSION, MAX_HANDS, RECORD_DTYPE.itemsize))
+        self._files[session_id] = handle
+        return handle
+
+
+def read_stream(path: str) -> np.ndarray:
+    """Memory-map a recorded stream as a structured RECORD_DTYPE array"""
+    with open(path, "rb") as handle:
+        header = handle.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+
+    magic, version, max_hands, itemsize = _HEADER.unpack(header)
+    if magic != _MAGIC or version != STREAM_VERSION:
+        raise ValueError(f"{path} is not a gesture stream")
+    if max_hands != MAX_HANDS or itemsize != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} was recorded with a different record layout")
+
+    # A live recorder may have written a partial record at the end; ignore it
+    count = (os.path.getsize(path) - _HEADER.size) // itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=_HEADER.size, shape=(count,))
+
+
+def replay_stream(records: np.ndarray, classifier: Optional[GestureClassifier] = None,
+                  temporal: bool = True) -> Dict:
+    """Re-classify every frame of a stream and summarize the gestures.
+
+    Frames go through ``classifier.classify_landmarks`` one by one, after a
+    fresh TemporalTracker unless ``temporal`` is off, exactly as
+    GestureRecognizer.process_frame handles live landmarks.
+    """
+    classifier = classifier or GestureClassifier()
+    tracker = TemporalTracker() if temporal else None
+    hands = np.minimum(records["hands"], MAX_HANDS).astype(np.intp)
+
+    results = []
+    counts: Dict[str, int] = {}
+    for t, count, landmarks in zip(records["t"].tolist(), hands.tolist(), records["landmarks"]):
+        landmarks = np.array(landmarks[:count])
+        if tracker is not None:
+            landmarks = tracker.update(landmarks, t)
+        gestures = classifier.classify_landmarks(landmarks, tracker)["gestures"]
+        for gesture in gestures:
+            counts[gesture["type"]] = counts.get(gesture["type"], 0) + 1
+        results.append({"gestures": gestures})
+
+    timestamps = records["t"]
+    return {
+        "frames": len(records),
+        "hands": int(hands.sum()),
+        "duration_seconds": float(timestamps[-1] - timestamps[0]) if len(records) else 0.0,
+        "gesture_counts": counts,
+        "timeline": build_gesture_timeline(results)
+    }
+
+
+def _stream_files(paths: Iterable[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith(STREAM_SUFFIX)
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded gesture streams through the classifier")
+    parser.add_argument("paths", nargs="+", help="stream files or directories of them")
+    parser.add_argument("--output", help="write per-stream summaries and timelines as JSON")
+    parser.add_argument("--templates", help="classify with a gesture_templates library, as GESTURE_TEMPLATES does")
+    parser.add_argument("--no-temporal", action="store_true",
+                        help="skip smoothing and motion gestures, as GESTURE_TEMPORAL=0 does")
+    args = parser.parse_args(argv)
+
+    classifier = GestureClassifier(args.templates)
+    summaries = {}
+    frames = 0
+    recorded_seconds = 0.0
+
+    start = time.perf_counter()
+    for path in _stream_files(args.paths):
+        summary = replay_stream(read_stream(path), classifier, temporal=not args.no_temporal)
+        summaries[path] = summary
+        frames += summary["frames"]
+        recorded_seconds += summary["duration_seconds"]
+        print(f"{path}: {summary['frames']} frames, {summary['gesture_counts']}")
+    elapsed = time.perf_counter() - start
+
+    speedup = recorded_seconds / elapsed if elapsed else 0.0
+    print(f"Replayed {frames} frames from {len(summaries)} streams in {elapsed:.3f}s "
+          f"({frames / elapsed if elapsed else 0.0:.0f} frames/s, {speedup:.0f}x real time)")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(summaries, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Data-driven gesture classification by nearest-neighbour template matching.
+
+Each hand is normalized into a pose vector that does not depend on where the
+hand is, how large it appears or how it is turned in the image, then matched
+against a library of labelled template poses with scipy's cKDTree. Where
+scipy is missing (it is in requirements.txt) a vectorized brute-force numpy
+search over every template gives the same answers, 2-3x slower at a few
+thousand templates. Adding a gesture class means recording it, not writing
+a new detector.
+
+Build a library from recorded streams (see gesture_recorder), one label per
+group of recordings, and point GESTURE_TEMPLATES at it:
+
+    python gesture_templates.py templates.npz --label drag recordings/drag-*.gstream \\
+        --label pour recordings/pour-*.gstream
+"""
+import argparse
+import functools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from gesture_engine import MIDDLE_MCP, WRIST
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def normalize_landmarks(landmarks: np.ndarray, orientation_weight: float = 0.0) -> np.ndarray:
+    """Turn (hands, 21, 3) landmarks into translation, scale and rotation invariant vectors.
+
+    The wrist moves to the origin, the wrist -> middle MCP axis is rotated to
+    point straight up and scaled to unit length, and the (now constant) wrist
+    is dropped, leaving 60 values per hand. Some gestures (pour) *are* a
+    rotation, so with ``orientation_weight`` above zero the unit axis
+    direction, scaled by that weight, is appended as two more values.
+    """
+    centred = landmarks[:, 1:] - landmarks[:, WRIST:WRIST + 1]
+    axis = centred[:, MIDDLE_MCP - 1, :2]
+    length = np.maximum(np.hypot(axis[:, 0], axis[:, 1]), 1e-6)
+
+    # Rotate so the axis maps to (0, -1), i.e. up in image coordinates
+    cos = -axis[:, 1] / length
+    sin = -axis[:, 0] / length
+    x, y = centred[..., 0], centred[..., 1]
+    normalized = np.empty_like(centred)
+    normalized[..., 0] = x * cos[:, None] - y * sin[:, None]
+    normalized[..., 1] = x * sin[:, None] + y * cos[:, None]
+    normalized[..., 2] = centred[..., 2]
+    normalized /= length[:, None, None]
+    vectors = normalized.reshape(len(landmarks), -1)
+    if orientation_weight > 0:
+        direction = axis / length[:, None] * orientation_weight
+        vectors = np.concatenate([vectors, direction], axis=1)
+    return vectors.astype(np.float32)
+
+
+class TemplateLibrary:
+    """Labelled template poses with a nearest-neighbour index over them"""
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, label_names: Sequence[str],
+                 orientation_weight: float = 0.0, k: int = 5, max_distance: float = 1.0,
+                 min_confidence: float = 0.6):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.label_names = list(label_names)
+        self.orientation_weight = orientation_weight
+        self.k = min(k, len(self.vectors))
+        self.max_distance = max_distance
+        self.min_confidence = min_confidence
+
+        if cKDTree is not None:
+            self._tree = cKDTree(self.vectors)
+        else:
+            self._tree = None
+            self._squared_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    @classmethod
+    def load(cls, path: str, **options) -> "TemplateLibrary":
+        with np.load(path) as data:
+            return cls(data["vectors"], data["labels"], data["label_names"].tolist(),
+                       float(data["orientation_weight"]), **options)
+
+    def save(self, path: str):
+        np.savez_compressed(path, vectors=self.vectors, labels=self.labels,
+                            label_names=np.array(self.label_names),
+                            orientation_weight=np.float32(self.orientation_weight))
+
+    def nearest(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and template indices of the k nearest templates, each (queries, k)"""
+        if self._tree is not None:
+            distances, indices = self._tree.query(queries, k=self.k)
+            return distances.reshape(len(queries), -1), indices.reshape(len(queries), -1)
+
+        # |q - t|^2 = |q|^2 + |t|^2 - 2 q.t, for every pair in one matrix product
+        squared = (np.einsum("ij,ij->i", queries, queries)[:, None]
+                   + self._squared_norms[None, :] - 2.0 * queries @ self.vectors.T)
+        indices = np.argpartition(squared, self.k - 1, axis=1)[:, :self.k]
+        nearest = np.take_along_axis(squared, indices, axis=1)
+        order = np.argsort(nearest, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        distances = np.sqrt(np.maximum(np.take_along_axis(nearest, order, axis=1), 0.0))
+        return distances, indices
+
+    def classify(self, landmarks: np.ndarray) -> List[Optional[Tuple[str, float]]]:
+        """Best (label, confidence) per hand by distance-weighted k-NN vote, or None if no match"""
+        if len(landmarks) == 0 or self.k == 0:
+            return [None] * len(landmarks)
+
+        distances, indices = self.nearest(normalize_landmarks(landmarks, self.orientation_weight))
+        weights = np.where(distances <= self.max_distance, 1.0 / (distances + 1e-3), 0.0)
+        votes = np.zeros((len(landmarks), len(self.label_names)))
+        np.add.at(votes, (np.arange(len(landmarks))[:, None], self.labels[indices]), weights)
+
+        matches: List[Optional[Tuple[str, float]]] = []
+        totals = votes.sum(axis=1)
+        for hand_votes, total in zip(votes, totals):
+            if total == 0:
+                matches.append(None)
+                continue
+            best = int(hand_votes.argmax())
+            confidence = float(hand_votes[best] / total)
+            matches.append((self.label_names[best], confidence) if confidence >= self.min_confidence else None)
+        return matches
+
+
+@functools.lru_cache(maxsize=None)
+def load_templates(path: str) -> TemplateLibrary:
+    """Load a template library once per process and share it between classifiers"""
+    return TemplateLibrary.load(path)
+
+
+def build_library(groups: Dict[str, List[str]], stride: int = 1,
+                  orientation_weight: float = 1.0) -> TemplateLibrary:
+    """Create a library from recorded streams, labelling every recorded hand with its group's label"""
+    from gesture_recorder import read_stream
+
+    label_names = sorted(groups)
+    vectors, labels = [], []
+    for label, paths in groups.items():
+        for path in paths:
+            records = read_stream(path)[::stride]
+            present = np.arange(records["landmarks"].shape[1]) < records["hands"][:, None]
+            hands = np.asarray(records["landmarks"][present])
+            if len(hands):
+                vectors.append(normalize_landmarks(hands, orientation_weight))
+                labels.append(np.full(len(hands), label_names.index(label), dtype=np.int32))
+
+    if not vectors:
+        raise ValueError("No hands found in the given recordings")
+    return TemplateLibrary(np.concatenate(vectors), np.concatenate(labels), label_names, orientation_weight)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build a gesture template library from recorded streams")
+    parser.add_argument("output", help="template library to write (.npz)")
+    parser.add_argument("--label", nargs="+", action="append", required=True, metavar=("NAME", "STREAM"),
+                        help="a gesture label followed by the recordings that show it (repeatable)")
+    parser.add_argument("--stride", type=int, default=1, help="keep every Nth recorded frame")
+    parser.add_argument("--orientation-weight", type=float, default=1.0,
+                        help="how much hand orientation counts against pose shape (0 ignores it)")
+    args = parser.parse_args(argv)
+
+    groups: Dict[str, List[str]] = {}
+    for name, *paths in args.label:
+        groups.setdefault(name, []).extend(paths)
+
+    library = build_library(groups, args.stride, args.orientation_weight)
+    library.save(args.output)
+    counts = np.bincount(library.labels, minlength=len(library.label_names))
+    print(f"Wrote {len(library.vectors)} templates to {args.output}: "
+          + ", ".join(f"{name} {count}" for name, count in zip(library.label_names, counts)))
+
+
+if __name__ == "__main__":
+    main()
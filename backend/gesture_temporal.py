@@ -0,0 +1,220 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from gesture_engine import MAX_HANDS, PALM_MCP_SLICE, WRIST, MIDDLE_MCP
+
+_PALM_POINTS = len(range(21)[PALM_MCP_SLICE])
+
+
+def _smoothing_factor(dt: float, cutoff):
+    # alpha = 1 / (1 + tau / dt) with tau = 1 / (2 pi cutoff), rearranged to avoid divisions
+    scaled = (2 * math.pi * dt) * cutoff
+    return scaled / (scaled + 1.0)
+
+
+class OneEuroFilter:
+    """One Euro low-pass filter over an array of values.
+
+    Slow movement is smoothed heavily (``min_cutoff`` Hz) to remove jitter,
+    while the cutoff rises with speed (``beta``) so fast movement is not
+    lagged. The smoothed derivative is kept as ``velocity``.
+    """
+
+    def __init__(self, min_cutoff: float = 1.0, beta: float = 0.05, d_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value: Optional[np.ndarray] = None
+        self.velocity: Optional[np.ndarray] = None
+        self._t: Optional[float] = None
+
+    def reset(self):
+        self.value = self.velocity = self._t = None
+
+    def __call__(self, x: np.ndarray, t: float) -> np.ndarray:
+        if self.value is None or t <= self._t:
+            self.value = np.array(x, dtype=np.float32)
+            self.velocity = np.zeros_like(self.value)
+            self._t = t
+            return self.value
+
+        dt = t - self._t
+        raw_velocity = (x - self.value) / dt
+        self.velocity += _smoothing_factor(dt, self.d_cutoff) * (raw_velocity - self.velocity)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        self.value += _smoothing_factor(dt, cutoff) * (x - self.value)
+        self._t = t
+        return self.value
+
+
+class _HandTrack:
+    """Smoothing and rotation state for one tracked hand"""
+
+    def __init__(self, history: int, min_cutoff: float, beta: float):
+        self.filter = OneEuroFilter(min_cutoff, beta)
+        self.present = False
+        self.palm = (0.0, 0.0)
+        # Ring buffer of per-frame orientation changes, with its running sum
+        self.turns = np.zeros(history, dtype=np.float64)
+        self.times = np.zeros(history, dtype=np.float64)
+        self.turn_sum = 0.0
+        self.frames = 0
+        self.angle: Optional[float] = None
+
+    def reset(self):
+        self.filter.reset()
+        self.present = False
+        self.turns[:] = 0.0
+        self.turn_sum = 0.0
+        self.frames = 0
+        self.angle = None
+
+    def update(self, hand: np.ndarray, t: float) -> np.ndarray:
+        smoothed = self.filter(hand, t)
+        self.present = True
+        palm_x, palm_y, _ = (smoothed[PALM_MCP_SLICE].sum(axis=0) / _PALM_POINTS).tolist()
+        self.palm = (palm_x, palm_y)
+
+        # Orientation of the wrist -> middle MCP axis in the image plane
+        (wrist_x, wrist_y, _), (mcp_x, mcp_y, _) = smoothed[[WRIST, MIDDLE_MCP]].tolist()
+        angle = math.atan2(mcp_y - wrist_y, mcp_x - wrist_x)
+        turn = 0.0
+        if self.angle is not None:
+            turn = (angle - self.angle + math.pi) % (2 * math.pi) - math.pi
+        self.angle = angle
+
+        slot = self.frames % len(self.turns)
+        self.turn_sum += turn - self.turns[slot]
+        self.turns[slot] = turn
+        self.times[slot] = t
+        self.frames += 1
+        return smoothed
+
+    def palm_velocity(self) -> List[float]:
+        return (self.filter.velocity[PALM_MCP_SLICE].sum(axis=0) / _PALM_POINTS).tolist()
+
+    def angular_velocity(self) -> float:
+        """Mean rotation rate over the buffered window, in radians per second"""
+        if self.frames < 2:
+            return 0.0
+        window = min(self.frames, len(self.turns))
+        newest = self.times[(self.frames - 1) % len(self.turns)]
+        oldest = self.times[(self.frames - window) % len(self.turns)]
+        return self.turn_sum / (newest - oldest) if newest > oldest else 0.0
+
+
+class TemporalTracker:
+    """Per-session landmark history that turns single frames into motion.
+
+    ``update`` smooths each hand with a One Euro filter and keeps a ring
+    buffer of its recent orientation changes; ``annotate`` (called by
+    GestureClassifier.classify_landmarks) adds gestures that need motion:
+    rotate from the hand's angular velocity, palm velocity on drag and draw,
+    and two-hand zoom from the rate the palms move apart. Every update is
+    O(1) in the history length, and smoothing means fewer frames are needed
+    for a stable reading, so clients can send at a lower rate.
+    """
+
+    def __init__(self, history: int = 8, min_cutoff: float = 1.0, beta: float = 0.05,
+                 rotate_speed: float = 1.5, rotate_angle: float = 0.35, zoom_speed: float = 0.15):
+        self.rotate_speed = rotate_speed
+        self.rotate_angle = rotate_angle
+        self.zoom_speed = zoom_speed
+        self._tracks = [_HandTrack(history, min_cutoff, beta) for _ in range(MAX_HANDS)]
+        self._spread = OneEuroFilter(min_cutoff, beta)
+        self._order: List[int] = []
+
+    def close(self):
+        """Nothing to release; present so RecognizerPool can hold trackers"""
+
+    def counters(self) -> Dict[str, int]:
+        return {}
+
+    def update(self, landmarks: np.ndarray, timestamp: Optional[float] = None) -> np.ndarray:
+        """Smooth a (hands, 21, 3) landmark array and advance the motion state"""
+        t = time.monotonic() if timestamp is None else timestamp
+        hands = min(len(landmarks), MAX_HANDS)
+        self._order = self._match(landmarks[:hands])
+
+        smoothed = np.empty((hands, 21, 3), dtype=np.float32)
+        for hand, track_index in enumerate(self._order):
+            smoothed[hand] = self._tracks[track_index].update(landmarks[hand], t)
+        for track_index, track in enumerate(self._tracks):
+            if track_index not in self._order:
+                track.reset()
+
+        if hands == 2:
+            (x0, y0), (x1, y1) = self._tracks[0].palm, self._tracks[1].palm
+            self._spread(np.array([math.hypot(x1 - x0, y1 - y0)]), t)
+        else:
+            self._spread.reset()
+        return smoothed
+
+    def annotate(self, gestures_per_hand: List[List[Dict]], gesture_data: Dict):
+        """Add motion-derived gestures and velocities to a classification result"""
+        velocities = []
+        for hand, gestures in enumerate(gestures_per_hand):
+            track = self._tracks[self._order[hand]] if hand < len(self._order) else None
+            if track is None:
+                velocities.append([0.0, 0.0, 0.0])
+                continue
+
+            velocity = track.palm_velocity()
+            velocities.append(velocity)
+            for gesture in gestures:
+                if gesture["type"] in ("drag", "draw"):
+                    gesture["velocity"] = velocity[:2]
+
+            # A turning hand, not just a spread one, is what rotates 3D models
+            window_turn = track.turn_sum
+            angular_velocity = track.angular_velocity()
+            if abs(angular_velocity) > self.rotate_speed and abs(window_turn) > self.rotate_angle:
+                gestures.append({
+                    "type": "rotate",
+                    "confidence": min(0.95, 0.7 + abs(window_turn) / math.pi),
+                    # Image y points down, so a positive angle change is clockwise on screen
+                    "direction": "clockwise" if angular_velocity > 0 else "counterclockwise",
+                    "angular_velocity": float(angular_velocity)
+                })
+
+        gesture_data["palm_velocity"] = velocities
+
+        if len(gestures_per_hand) == 2 and self._spread.value is not None:
+            rate = float(self._spread.velocity[0])
+            if abs(rate) > self.zoom_speed:
+                gestures_per_hand[0].append({
+                    "type": "zoom",
+                    "confidence": 0.85,
+                    "scale": max(0.0, min(1.0, float(self._spread.value[0]))),
+                    "direction": "out" if rate > 0 else "in",
+                    "hands": 2
+                })
+
+    def _match(self, landmarks: np.ndarray) -> List[int]:
+        """Assign each detected hand to a track, keeping hands on the track nearest their palm"""
+        if len(landmarks) == 0:
+            return []
+
+        live = [index for index, track in enumerate(self._tracks) if track.present]
+        if not live:
+            return list(range(len(landmarks)))
+
+        palms = (landmarks[:, PALM_MCP_SLICE, :2].sum(axis=1) / _PALM_POINTS).tolist()
+
+        def distance(hand: int, track_index: int) -> float:
+            if not self._tracks[track_index].present:
+                return 0.0
+            x, y = self._tracks[track_index].palm
+            return math.hypot(palms[hand][0] - x, palms[hand][1] - y)
+
+        if len(landmarks) == 1:
+            return [min(live, key=lambda index: distance(0, index))]
+
+        # Two hands: keep or swap track order, whichever moves the palms least
+        straight = distance(0, 0) + distance(1, 1)
+        swapped = distance(0, 1) + distance(1, 0)
+        return [1, 0] if swapped < straight else [0, 1]
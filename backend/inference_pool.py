@@ -0,0 +1,577 @@
+import asyncio
+import functools
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from gesture_codec import encode_compact
+from gesture_engine import GestureRecognizer, build_gesture_timeline, decode_frame, frame_color_order, warm_up_recognizer
+from gesture_pipeline import StreamPipeline
+from gesture_recorder import GestureRecorder, wall_clock
+from metrics import GESTURE_STAGE_SECONDS, process_rss_bytes
+from recognizer_pool import RecognizerPool
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class InferenceQueueFull(Exception):
+    """Raised when more frames are waiting than the submission queue allows"""
+
+
+class InvalidFrame(ValueError):
+    """Raised when a frame payload cannot be decoded into an image"""
+
+
+class FrameSuperseded(Exception):
+    """Raised for a queued frame replaced by a newer one from the same session"""
+
+
+class InferenceWorkerLost(Exception):
+    """Raised when a worker process died handling a request; the worker is replaced"""
+
+
+class _SessionSlot:
+    """Coalescing state for one session: whether a frame is running and who waits next"""
+
+    def __init__(self):
+        self.busy = False
+        self.waiter: Optional[asyncio.Future] = None
+
+
+# Recognizers owned by this process; set by _init_worker in each worker
+_recognizer_pool: Optional[RecognizerPool] = None
+# Landmark stream recorder, only when recording is enabled
+_recorder: Optional[GestureRecorder] = None
+# Pipelines of the WebSocket streams served by this process, by stream id, and
+# the queue their output travels back to the API process on
+_streams: Dict[str, StreamPipeline] = {}
+_stream_output = None
+
+
+def _init_worker(max_instances: int, ttl_seconds: float, recognizer_options: Dict,
+                 record_dir: Optional[str] = None, stream_output=None):
+    global _recognizer_pool, _recorder, _stream_output
+    _recognizer_pool = RecognizerPool(
+        max_instances=max_instances,
+        ttl_seconds=ttl_seconds,
+        factory=functools.partial(GestureRecognizer, **recognizer_options)
+    )
+    _recorder = GestureRecorder(record_dir) if record_dir else None
+    _stream_output = stream_output
+
+
+def _record(session_id: str, recognizer: GestureRecognizer, gesture_data: Dict):
+    # Stale results repeat the previous frame, so only fresh inference is recorded
+    if _recorder is not None and not gesture_data["stale"]:
+        _recorder.append(session_id, recognizer.last_landmarks, wall_clock(recognizer.last_timestamp))
+
+
+def _run_frame(session_id: str, data: bytes, frame_layout: Dict, precision: Optional[int] = None,
+               timestamp: Optional[float] = None) -> Tuple[Union[Dict, bytes], Dict[str, float], Dict]:
+    """Decode and classify one frame inside a worker, returning the result, stage timings and worker stats"""
+    start = time.perf_counter()
+    frame = decode_frame(data, **frame_layout)
+    decode_seconds = time.perf_counter() - start
+    if frame is None:
+        raise InvalidFrame("Invalid image data")
+
+    color_order = frame_color_order(frame_layout.get("frame_format", "jpeg"))
+    with _recognizer_pool.session(session_id) as recognizer:
+        gesture_data = recognizer.process_frame(frame, color_order, timestamp)
+        timings = dict(recognizer.last_timings, imdecode=decode_seconds)
+        _record(session_id, recognizer, gesture_data)
+
+    # Encoding here keeps both the serialization and the result pickling small
+    if precision is not None:
+        start = time.perf_counter()
+        gesture_data = encode_compact(gesture_data, precision)
+        timings["compact_encode"] = time.perf_counter() - start
+    return gesture_data, timings, _worker_stats()
+
+
+def _run_batch(session_id: str, frames: List[bytes], frame_layout: Dict,
+               timestamps: List[float]) -> Tuple[Dict, List[Dict[str, float]], Dict]:
+    """Decode a burst of frames in parallel, then classify them in order at their capture times"""
+    # cv2.imdecode releases the GIL, so threads decode the burst concurrently
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(len(frames), 4) or 1) as decoder:
+        decoded = list(decoder.map(lambda data: decode_frame(data, **frame_layout), frames))
+    timings = [{"batch_decode": time.perf_counter() - start}]
+
+    results = []
+    color_order = frame_color_order(frame_layout.get("frame_format", "jpeg"))
+    # Frames run through one recognizer in order so tracking carries across the burst
+    with _recognizer_pool.session(session_id) as recognizer:
+        for frame, timestamp in zip(decoded, timestamps):
+            if frame is None:
+                results.append({"error": "Invalid image data"})
+            else:
+                results.append(recognizer.process_frame(frame, color_order, timestamp))
+                timings.append(recognizer.last_timings)
+                _record(session_id, recognizer, results[-1])
+
+    return {"frames": results, "timeline": build_gesture_timeline(results)}, timings, _worker_stats()
+
+
+def _open_stream(stream_id: str, session_id: str, precision: Optional[int], queue_size: int):
+    _streams[stream_id] = StreamPipeline(
+        session_id,
+        _recognizer_pool,
+        emit=functools.partial(_emit_stream, stream_id),
+        precision=precision,
+        queue_size=queue_size,
+        recorder=_recorder
+    )
+
+
+def _emit_stream(stream_id: str, payload: Union[str, bytes], status: str, timings: Dict[str, float]):
+    # Frame results carry the worker's stats back, as _run_frame results do
+    report = _worker_stats() if status == "frame" else None
+    _stream_output.put((stream_id, payload, status, timings, report))
+
+
+def _stream_frame(stream_id: str, data: bytes, frame_layout: Dict, timestamp: float):
+    _streams[stream_id].submit(data, frame_layout, timestamp)
+
+
+def _stream_message(stream_id: str, message: Dict):
+    _streams[stream_id].send(message)
+
+
+def _close_stream(stream_id: str, session_id: str, discard: bool):
+    pipeline = _streams.pop(stream_id)
+
+    def finish():
+        pipeline.close()
+        if discard:
+            _recognizer_pool.discard(session_id)
+        if _recorder is not None:
+            _recorder.close_session(session_id)
+        _stream_output.put((stream_id, None, "closed", {}, _worker_stats()))
+
+    # Draining the pipeline takes a few frames; other calls to this worker need not wait for it
+    threading.Thread(target=finish, name=f"gesture-close-{stream_id}", daemon=True).start()
+
+
+def _warm_up_worker() -> Dict:
+    start = time.perf_counter()
+    warm_up_recognizer(_recognizer_pool.factory)
+    return {"seconds": time.perf_counter() - start, "rss_bytes": process_rss_bytes()}
+
+
+def _worker_stats() -> Dict:
+    # Shipped back with every result, so the API process never has to queue a stats call
+    return {"recognizers": _recognizer_pool.stats(), "counters": _recognizer_pool.recognizer_counters()}
+
+
+def _empty_report() -> Dict:
+    return {"recognizers": {}, "counters": {}}
+
+
+def _close_worker():
+    for pipeline in _streams.values():
+        pipeline.close()
+    _streams.clear()
+    if _recognizer_pool is not None:
+        _recognizer_pool.close()
+    if _recorder is not None:
+        _recorder.close()
+
+
+class GestureStream:
+    """Handle on a WebSocket stream's StreamPipeline, which runs in the worker owning its session.
+
+    Made by InferencePool.open_stream and used from the event loop. ``submit``
+    and ``send`` never block, and every frame and message is answered through
+    ``deliver`` in the order it was given.
+    """
+
+    def __init__(self, pool: "InferencePool", session_id: str, deliver: Callable[[Union[str, bytes]], None],
+                 precision: Optional[int], queue_size: int, discard_session: bool):
+        self.stream_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.deliver = deliver
+        self.precision = precision
+        self.queue_size = queue_size
+        self.discard_session = discard_session
+        self.index = pool._worker_index(session_id)
+        self.loop = asyncio.get_running_loop()
+        # Executor the pipeline was opened on, and frames sent to it not yet answered
+        self.executor: Optional[Executor] = None
+        self.frames = 0
+        self.closing = False
+        self._pool = pool
+
+    def submit(self, data: bytes, frame_layout: Dict, timestamp: Optional[float] = None):
+        """Send a frame down the pipeline; it counts against the pool's queue size until answered.
+
+        ``timestamp`` is the capture time in time.monotonic() seconds, by
+        default now: frames wait in queues, so the worker cannot tell it.
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self._pool._stream_frame(self, data, frame_layout, timestamp)
+
+    def send(self, message: Dict):
+        """Answer with a message once the frames submitted before it have been answered"""
+        self._pool._stream_call(self, _stream_message, self.stream_id, message)
+
+    def close(self):
+        """Let the pipeline finish its queued frames, then release it"""
+        if not self.closing:
+            self.closing = True
+            self._pool._stream_call(self, _close_stream, self.stream_id, self.session_id, self.discard_session)
+
+
+class InferencePool:
+    """Runs gesture inference off the event loop.
+
+    With ``workers > 0`` every worker is a separate process holding its own
+    RecognizerPool, so decoding and MediaPipe use all cores. Sessions are
+    pinned to one worker by hashing the session id, which keeps each
+    student's tracking state in a single process. ``workers == 0`` runs the
+    same code on a thread pool inside the API process.
+
+    Frames for a session are coalesced latest-frame-wins: while one frame
+    runs, at most one more waits, and a newer frame replaces it (the replaced
+    call raises FrameSuperseded). At most ``queue_size`` frames may be
+    running or waiting at once; further submissions fail fast with
+    InferenceQueueFull instead of piling up, so latency stays flat under
+    overload.
+    WebSocket streams (``open_stream``) run a StreamPipeline in the same
+    worker as their session, so they scale across the workers as well.
+    Their frames count against ``queue_size`` until answered; frames over it
+    are answered with ``{"skipped": "queue_full"}``.
+    A worker process that dies (e.g. MediaPipe crashing) is replaced and the
+    calls it took down fail with InferenceWorkerLost. They are not retried,
+    since the frame that crashed it would crash the new worker as well. Its
+    sessions start over with fresh recognizers and its streams' pipelines
+    are reopened.
+    ``max_instances`` caps the recognizers of each worker, not of the pool:
+    sessions hash unevenly across workers, and a worker holding more live
+    sessions than its cap rebuilds a MediaPipe graph on nearly every frame.
+    With ``record_dir`` set, each worker appends the landmarks it detects to
+    per-session streams there (see gesture_recorder).
+    """
+
+    def __init__(self, workers: int = 1, queue_size: int = 64, max_instances: int = 32,
+                 ttl_seconds: float = 300.0, recognizer_options: Optional[Dict] = None,
+                 record_dir: Optional[str] = None, batch_frame_interval: float = 1 / 15):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_frame_interval = batch_frame_interval
+        self._in_flight = 0
+        self._waiting = 0
+        self._slots: Dict[str, _SessionSlot] = {}
+        self._streams: Dict[str, GestureStream] = {}
+        self._stats = {"submitted": 0, "rejected": 0, "superseded": 0, "stream_overflow": 0, "worker_restarts": 0}
+        recognizer_options = recognizer_options or {}
+
+        if workers > 0:
+            self._worker_args = (max_instances, ttl_seconds, recognizer_options, record_dir)
+            self._executors: List[Executor] = [None] * workers
+            self._outputs: List = [None] * workers
+            for index in range(workers):
+                self._start_worker(index)
+        else:
+            output = queue.Queue()
+            _init_worker(max_instances, ttl_seconds, recognizer_options, record_dir, output)
+            self._executors = [ThreadPoolExecutor(thread_name_prefix="gesture")]
+            self._outputs = [output]
+            self._start_output_reader(output)
+        # Latest stats each worker sent back with a result
+        self._worker_reports = [_empty_report() for _ in self._executors]
+        self._retired_counters: Dict[str, int] = {}
+
+    async def process(self, session_id: str, data: bytes, frame_layout: Optional[Dict] = None,
+                      precision: Optional[int] = None) -> Union[Dict, bytes]:
+        """Decode and classify a frame for a session without blocking the loop.
+
+        With ``precision`` set the result comes back already packed in the
+        compact binary encoding instead of as a dict.
+        """
+        start = time.perf_counter()
+        # Stamped on arrival, since the frame may wait behind others of its session
+        received = time.monotonic()
+        slot = await self._claim_slot(session_id)
+        try:
+            gesture_data, timings = await self._submit(
+                session_id, _run_frame, session_id, data, frame_layout or {}, precision, received, admitted=True)
+        finally:
+            self._release_slot(session_id, slot)
+        self._record_timings([timings], start)
+        return gesture_data
+
+    async def process_batch(self, session_id: str, frames: List[bytes], frame_layout: Optional[Dict] = None,
+                            timestamps: Optional[List[float]] = None) -> Dict:
+        """Classify a burst of frames for a session, preserving their order.
+
+        ``timestamps`` are the frames' capture times in seconds on any clock;
+        without them frames are taken to be ``batch_frame_interval`` apart.
+        Either way the burst is moved to end now, so motion is measured at
+        the spacing the frames were captured with rather than the few
+        milliseconds they are processed apart.
+        """
+        start = time.perf_counter()
+        if timestamps is None:
+            timestamps = [index * self.batch_frame_interval for index in range(len(frames))]
+        now = time.monotonic()
+        timestamps = [now - (timestamps[-1] - timestamp) for timestamp in timestamps]
+        batch_data, timings = await self._submit(
+            session_id, _run_batch, session_id, frames, frame_layout or {}, timestamps)
+        self._record_timings(timings, start)
+        return batch_data
+
+    def open_stream(self, session_id: str, deliver: Callable[[Union[str, bytes]], None],
+                    precision: Optional[int] = None, queue_size: int = 2,
+                    discard_session: bool = False) -> GestureStream:
+        """Start a streaming pipeline in the session's worker; call from the event loop.
+
+        ``deliver`` is called on the loop with each outgoing message. With
+        ``discard_session`` the session's recognizer is released once the
+        stream closes.
+        """
+        stream = GestureStream(self, session_id, deliver, precision, queue_size, discard_session)
+        self._streams[stream.stream_id] = stream
+        return stream
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats, in_flight=self._in_flight, waiting=self._waiting, workers=self.workers,
+                    streams=len(self._streams))
+
+    async def warm_up(self) -> List[Dict]:
+        """Load MediaPipe in every worker by running a blank frame; returns seconds and RSS per worker"""
+        calls = [self._call_worker(index, _warm_up_worker) for index in range(len(self._executors))]
+        return list(await asyncio.gather(*calls))
+
+    def worker_stats(self) -> List[Dict]:
+        """Recognizer pool stats plus path and motion gate counters as each worker last reported them"""
+        return [dict(report) for report in self._worker_reports]
+
+    def recognizer_counters(self) -> Dict[str, int]:
+        """Path and motion gate counters summed over every worker, including ones that have been replaced"""
+        totals = dict(self._retired_counters)
+        for report in self._worker_reports:
+            for name, count in report["counters"].items():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def close(self):
+        for executor in self._executors:
+            if self.workers > 0:
+                try:
+                    executor.submit(_close_worker)
+                except BrokenProcessPool:
+                    pass
+            executor.shutdown(wait=True)
+        if self.workers == 0:
+            _close_worker()
+        for output in self._outputs:
+            output.put(None)
+
+    def _check_depth(self):
+        if self._in_flight + self._waiting >= self.queue_size:
+            self._stats["rejected"] += 1
+            raise InferenceQueueFull(f"Gesture queue is full ({self.queue_size} frames pending)")
+
+    async def _claim_slot(self, session_id: str) -> _SessionSlot:
+        """Wait until this frame may run for its session, or raise if a newer frame replaces it"""
+        slot = self._slots.get(session_id)
+        if slot is None or not slot.busy:
+            # Checked before the slot is stored, so a rejected frame leaves nothing behind
+            self._check_depth()
+            if slot is None:
+                slot = self._slots[session_id] = _SessionSlot()
+            slot.busy = True
+            return slot
+
+        if slot.waiter is not None:
+            # Only the newest frame matters: the one already waiting is dropped
+            slot.waiter.set_result(False)
+            self._stats["superseded"] += 1
+        else:
+            self._check_depth()
+            self._waiting += 1
+
+        waiter = slot.waiter = asyncio.get_running_loop().create_future()
+        try:
+            granted = await waiter
+        except asyncio.CancelledError:
+            if slot.waiter is waiter:
+                slot.waiter = None
+                self._waiting -= 1
+            elif waiter.done() and not waiter.cancelled() and waiter.result():
+                # The slot was handed over just as the caller went away; pass it on
+                self._release_slot(session_id, slot)
+            raise
+
+        if not granted:
+            raise FrameSuperseded("A newer frame from this session replaced this one")
+        return slot
+
+    def _release_slot(self, session_id: str, slot: _SessionSlot):
+        waiter = slot.waiter
+        if waiter is not None:
+            # Hand the slot straight to the waiting frame so nothing can overtake it
+            slot.waiter = None
+            self._waiting -= 1
+            waiter.set_result(True)
+            return
+
+        slot.busy = False
+        if self._slots.get(session_id) is slot:
+            del self._slots[session_id]
+
+    async def _submit(self, session_id: str, fn, *args, admitted: bool = False):
+        if not admitted:
+            self._check_depth()
+
+        self._in_flight += 1
+        self._stats["submitted"] += 1
+        index = self._worker_index(session_id)
+        try:
+            result, timings, self._worker_reports[index] = await self._call_worker(index, fn, *args)
+        finally:
+            self._in_flight -= 1
+        return result, timings
+
+    async def _call_worker(self, index: int, fn, *args):
+        """Run fn on one worker, replacing the worker if its process dies"""
+        executor = self._executors[index]
+        try:
+            return await asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            self._replace_worker(index, executor)
+        raise InferenceWorkerLost("The gesture worker stopped while processing this request")
+
+    def _start_worker(self, index: int):
+        context = multiprocessing.get_context("spawn")
+        output = context.Queue()
+        self._outputs[index] = output
+        self._executors[index] = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=self._worker_args + (output,)
+        )
+        self._start_output_reader(output)
+
+    def _replace_worker(self, index: int, broken: Executor):
+        # Every call the dead process held fails at once; only the first one restarts it
+        if self._executors[index] is not broken:
+            return
+        logger.error("Gesture worker %d died, starting a new one", index)
+        self._outputs[index].put(None)
+        self._start_worker(index)
+        self._stats["worker_restarts"] += 1
+        # Keep the dead worker's counts so the summed counters never go backwards
+        for name, count in self._worker_reports[index]["counters"].items():
+            self._retired_counters[name] = self._retired_counters.get(name, 0) + count
+        self._worker_reports[index] = _empty_report()
+        broken.shutdown(wait=False)
+
+        for stream in list(self._streams.values()):
+            if stream.index != index:
+                continue
+            # Whatever the dead pipeline held is lost; the next call reopens it on the new worker
+            self._in_flight -= stream.frames
+            stream.frames = 0
+            stream.executor = None
+            if stream.closing:
+                del self._streams[stream.stream_id]
+            else:
+                stream.deliver(json.dumps({"error": "Gesture worker restarted, frames in flight were lost"}))
+
+    def _stream_frame(self, stream: GestureStream, data: bytes, frame_layout: Dict, timestamp: float):
+        try:
+            self._check_depth()
+        except InferenceQueueFull:
+            # Answered in sequence, just like the pipeline's own overflow drops
+            self._stream_call(stream, _stream_message, stream.stream_id, {"skipped": "queue_full"})
+            return
+        stream.frames += 1
+        self._in_flight += 1
+        self._stats["submitted"] += 1
+        self._stream_call(stream, _stream_frame, stream.stream_id, data, frame_layout, timestamp)
+
+    def _stream_call(self, stream: GestureStream, fn, *args):
+        """Queue fn on the stream's worker without waiting; calls run there in the order made"""
+        executor = self._executors[stream.index]
+        if stream.executor is not executor:
+            # A new stream, or its worker was replaced: open the pipeline there first
+            stream.executor = executor
+            self._stream_call(stream, _open_stream, stream.stream_id, stream.session_id,
+                              stream.precision, stream.queue_size)
+        if self.workers == 0:
+            # These only hand work to the pipeline threads, so they run right here, in order
+            fn(*args)
+            return
+
+        try:
+            future = asyncio.wrap_future(executor.submit(fn, *args))
+        except BrokenProcessPool:
+            self._replace_worker(stream.index, executor)
+            return
+        future.add_done_callback(functools.partial(self._stream_call_done, stream.index, executor))
+
+    def _stream_call_done(self, index: int, executor: Executor, future: asyncio.Future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            self._replace_worker(index, executor)
+        elif error is not None:
+            logger.error("Gesture stream call failed", exc_info=error)
+
+    def _start_output_reader(self, output):
+        thread = threading.Thread(target=self._read_output, args=(output,), name="gesture-stream-output",
+                                  daemon=True)
+        thread.start()
+
+    def _read_output(self, output):
+        # Hands each stream message to the loop that owns the stream's socket
+        while True:
+            item = output.get()
+            if item is None:
+                return
+            stream = self._streams.get(item[0])
+            if stream is not None:
+                stream.loop.call_soon_threadsafe(self._stream_output, output, stream, *item[1:])
+
+    def _stream_output(self, output, stream: GestureStream, payload: Union[str, bytes, None], status: str,
+                       timings: Dict[str, float], report: Optional[Dict]):
+        if output is not self._outputs[stream.index]:
+            # Left over from a worker that has been replaced; its stream was already told
+            return
+        if report is not None:
+            self._worker_reports[stream.index] = report
+        for stage, seconds in timings.items():
+            GESTURE_STAGE_SECONDS.observe(seconds, stage)
+
+        if status == "closed":
+            self._streams.pop(stream.stream_id, None)
+            return
+        if status in ("frame", "overflow"):
+            stream.frames -= 1
+            self._in_flight -= 1
+        if status == "overflow":
+            self._stats["stream_overflow"] += 1
+        stream.deliver(payload)
+
+    def _record_timings(self, timings: List[Dict[str, float]], start: float):
+        # Worker stage timings are shipped back with results so one registry sees them all
+        for frame_timings in timings:
+            for stage, seconds in frame_timings.items():
+                GESTURE_STAGE_SECONDS.observe(seconds, stage)
+        GESTURE_STAGE_SECONDS.observe(time.perf_counter() - start, "worker_roundtrip")
+
+    def _worker_index(self, session_id: str) -> int:
+        # crc32 rather than hash() so the mapping does not depend on PYTHONHASHSEED
+        return zlib.crc32(session_id.encode()) % len(self._executors)
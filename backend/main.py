@@ -1,16 +1,37 @@
-from fastapi import FastAPI, HTTPException, Depends
+import time
+
+# Boot time is reported from here, before FastAPI and the app modules load
+STARTED_AT = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
+from pydantic import ValidationError
 import database
+import metrics
 import models
-from gesture_engine import GestureRecognizer
+from gesture_engine import (GestureClassifier, MAX_HANDS, RAW_FRAME_FORMATS, decode_landmarks,
+                            landmarks_from_lists, split_frame_timestamp, unpack_frames)
+from gesture_recorder import GestureRecorder
+from gesture_temporal import TemporalTracker
+from gesture_codec import COMPACT_MEDIA_TYPE, encode_compact, negotiate_precision, stream_precision
+from progress_writer import ProgressWriter
+from inference_pool import FrameSuperseded, InferencePool, InferenceQueueFull, InferenceWorkerLost, InvalidFrame
+from recognizer_pool import RecognizerPool, RecognizerPoolFull
+import asyncio
 import base64
-import cv2
-import numpy as np
 import json
-from datetime import datetime, date
+import logging
+import math
+import os
+import uuid
+import zlib
+from typing import Dict, List, Optional
+from datetime import datetime, date, timezone
 
 app = FastAPI(title="Rural STEM Quest API", version="1.0.0")
+logger = logging.getLogger("uvicorn.error")
 
 # CORS middleware
 app.add_middleware(
@@ -21,43 +42,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/analytics/{user_id}) so series stay bounded
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code)
+    )
+    return response
+
 # Initialize database
 database.init_db()
 
+# Buffer /progress/ rows and commit them in batches; PROGRESS_WRITE_BEHIND=0 commits each request
+progress_writer = ProgressWriter(
+    flush_rows=int(os.environ.get("PROGRESS_FLUSH_ROWS", "200")),
+    flush_interval=float(os.environ.get("PROGRESS_FLUSH_INTERVAL", "0.5")),
+    max_backlog=int(os.environ.get("PROGRESS_MAX_BACKLOG", "10000"))
+) if os.environ.get("PROGRESS_WRITE_BEHIND", "1") != "0" else None
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-gesture_recognizer = GestureRecognizer()
+# Directory for opt-in landmark stream recordings (see gesture_recorder); empty disables
+GESTURE_RECORD_DIR = os.environ.get("GESTURE_RECORD_DIR", "")
+
+# Motion trackers kept for landmark-only sessions, which are handled in this process
+GESTURE_POOL_SIZE = int(os.environ.get("GESTURE_POOL_SIZE", "32"))
+# Recognizers each gesture worker keeps. Sessions hash unevenly across workers, so this
+# should cover every concurrent session (a classroom of tablets), not a share of them
+GESTURE_WORKER_POOL_SIZE = int(os.environ.get("GESTURE_WORKER_POOL_SIZE", "48"))
+GESTURE_SESSION_TTL = float(os.environ.get("GESTURE_SESSION_TTL", "300"))
+RECOGNIZER_OPTIONS = {
+    "inference_size": int(os.environ.get("GESTURE_INFERENCE_SIZE", "320")),
+    "roi_margin": float(os.environ.get("GESTURE_ROI_MARGIN", "0.5")),
+    # Fraction of changed thumbnail pixels below which a frame reuses the last result; 0 disables
+    "motion_threshold": float(os.environ.get("GESTURE_MOTION_THRESHOLD", "0.005")),
+    "motion_max_skips": int(os.environ.get("GESTURE_MOTION_MAX_SKIPS", "10")),
+    # Smooth landmarks over time and detect rotate/two-hand zoom from motion
+    "temporal": os.environ.get("GESTURE_TEMPORAL", "1") != "0",
+    # Optional gesture_templates library replacing the threshold rules
+    "templates": os.environ.get("GESTURE_TEMPLATES") or None
+}
+# Load MediaPipe in every gesture worker at startup instead of on the first frame.
+# Off by default so API-only processes never load the vision stack at all.
+GESTURE_WARMUP = os.environ.get("GESTURE_WARMUP", "0") == "1"
+# Frames buffered in front of each streaming pipeline stage
+GESTURE_STREAM_QUEUE = int(os.environ.get("GESTURE_STREAM_QUEUE", "2"))
+# Seconds between frames assumed for batches uploaded without capture timestamps
+GESTURE_BATCH_FRAME_INTERVAL = float(os.environ.get("GESTURE_BATCH_FRAME_INTERVAL", str(1 / 15)))
 
-# Dependency to get database connection
-def get_db_connection():
-    with database.get_db() as conn:
-        yield conn
+# Gesture inference runs in worker processes, each with its own per-session
+# recognizers, so decoding and MediaPipe never block the event loop
+inference_pool = InferencePool(
+    workers=int(os.environ.get("GESTURE_WORKERS", os.cpu_count() or 1)),
+    queue_size=int(os.environ.get("GESTURE_QUEUE_SIZE", "64")),
+    max_instances=GESTURE_WORKER_POOL_SIZE,
+    ttl_seconds=GESTURE_SESSION_TTL,
+    recognizer_options=RECOGNIZER_OPTIONS,
+    record_dir=GESTURE_RECORD_DIR or None,
+    batch_frame_interval=GESTURE_BATCH_FRAME_INTERVAL
+)
+
+# Landmark-only clients track hands on-device, so no MediaPipe state is needed here,
+# only each session's motion history
+landmark_classifier = GestureClassifier(RECOGNIZER_OPTIONS["templates"])
+landmark_trackers = RecognizerPool(
+    max_instances=GESTURE_POOL_SIZE,
+    ttl_seconds=GESTURE_SESSION_TTL,
+    factory=TemporalTracker
+) if RECOGNIZER_OPTIONS["temporal"] else None
+# Records landmark sessions, which are handled in this process
+stream_recorder = GestureRecorder(GESTURE_RECORD_DIR) if GESTURE_RECORD_DIR else None
+
+startup_seconds: Optional[float] = None
+
+@app.on_event("startup")
+async def warm_up_gestures():
+    """Optionally warm the gesture workers, then report boot time and memory"""
+    global startup_seconds
+    
+    if GESTURE_WARMUP:
+        for index, worker in enumerate(await inference_pool.warm_up()):
+            logger.info("Gesture worker %d warmed up in %.2fs, RSS %s", index, worker["seconds"],
+                        format_bytes(worker["rss_bytes"]))
+    
+    startup_seconds = time.perf_counter() - STARTED_AT
+    logger.info("API ready in %.2fs, RSS %s", startup_seconds, format_bytes(metrics.process_rss_bytes()))
+
+def format_bytes(size: Optional[int]) -> str:
+    return "unknown" if size is None else f"{size / 2 ** 20:.0f} MiB"
+
+@app.on_event("shutdown")
+def close_inference_pool():
+    inference_pool.close()
+    if stream_recorder is not None:
+        stream_recorder.close()
+    if progress_writer is not None:
+        # Drain buffered progress before the connections go away
+        progress_writer.close()
+    database.close_pool()
+
+@app.exception_handler(database.DatabaseBusy)
+async def database_busy(request: Request, exc: database.DatabaseBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 @app.get("/")
 async def root():
     return {"message": "Rural STEM Quest API"}
 
 @app.post("/users/", response_model=models.UserResponse)
-async def create_user(user: models.UserCreate, conn = Depends(get_db_connection)):
-    cursor = conn.cursor()
-    
-    # Check if user exists
-    cursor.execute("SELECT id FROM users WHERE email = ? OR username = ?", 
-                  (user.email, user.username))
-    if cursor.fetchone():
-        raise HTTPException(status_code=400, detail="User already exists")
-    
+async def create_user(user: models.UserCreate):
     # In production, hash the password
     password_hash = f"hashed_{user.password}"  # Replace with actual hashing
     
-    cursor.execute('''
-        INSERT INTO users (username, email, password_hash, role, school, grade, language)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (user.username, user.email, password_hash, user.role, user.school, user.grade, user.language))
-    
-    conn.commit()
-    user_id = cursor.lastrowid
+    user_id = await database.run_db(database.insert_user, user.username, user.email, password_hash,
+                                    user.role, user.school, user.grade, user.language)
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="User already exists")
     
     return {
         "id": user_id,
@@ -70,34 +177,16 @@ async def create_user(user: models.UserCreate, conn = Depends(get_db_connection)
     }
 
 @app.get("/games/", response_model=list[models.Game])
-async def get_games(subject: str = None, difficulty: str = None, conn = Depends(get_db_connection)):
-    cursor = conn.cursor()
+async def get_games(subject: str = None, difficulty: str = None):
+    games = await database.run_db(database.list_games, subject, difficulty)
     
-    query = "SELECT * FROM games"
-    params = []
-    
-    if subject or difficulty:
-        query += " WHERE"
-        conditions = []
-        if subject:
-            conditions.append(" subject = ?")
-            params.append(subject)
-        if difficulty:
-            conditions.append(" difficulty = ?")
-            params.append(difficulty)
-        query += " AND".join(conditions)
-    
-    cursor.execute(query, params)
-    games = cursor.fetchall()
-    
-    return [dict(game) for game in games]
+    # game_data is stored as JSON text
+    return [dict(game, game_data=json.loads(game['game_data']) if game['game_data'] else None) for game in games]
 
 @app.get("/games/{game_id}/data")
-async def get_game_data(game_id: int, conn = Depends(get_db_connection)):
+async def get_game_data(game_id: int):
     """Get specific game data and initial state"""
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM games WHERE id = ?", (game_id,))
-    game = cursor.fetchone()
+    game = await database.run_db(database.get_game, game_id)
     
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -182,11 +271,9 @@ def generate_coding_game_data():
     }
 
 @app.post("/games/{game_id}/submit")
-async def submit_game_action(game_id: int, action_data: dict, conn = Depends(get_db_connection)):
+async def submit_game_action(game_id: int, action_data: dict):
     """Submit game action and get result"""
-    cursor = conn.cursor()
-    cursor.execute("SELECT subject FROM games WHERE id = ?", (game_id,))
-    game = cursor.fetchone()
+    game = await database.run_db(database.get_game, game_id)
     
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
@@ -307,71 +394,493 @@ def process_coding_action(action_data: dict):
         }
 
 @app.post("/progress/")
-async def save_progress(progress: models.ProgressCreate, conn = Depends(get_db_connection)):
-    cursor = conn.cursor()
+async def save_progress(progress: models.ProgressCreate):
+    row = database.progress_row(progress.user_id, progress.game_id, progress.score, progress.time_spent,
+                                progress.completed, progress.gestures_used, progress.game_specific_data)
+    if progress_writer is not None:
+        progress_writer.submit(row)
+    else:
+        await database.run_db(database.insert_progress_rows, [row])
+    return {"message": "Progress saved successfully"}
+
+MAX_BULK_RECORDS = int(os.environ.get("PROGRESS_MAX_BULK", "1000"))
+# Limit on the decompressed body, so a small gzip body cannot expand without bound
+MAX_BULK_BYTES = int(os.environ.get("PROGRESS_MAX_BULK_BYTES", str(8 * 2 ** 20)))
+
+def decompress_body(body: bytes, encoding: Optional[str], limit: int) -> bytes:
+    """Undo a gzip or deflate Content-Encoding, refusing bodies over ``limit`` bytes"""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        decompressor = zlib.decompressobj()
+    elif encoding == "identity":
+        decompressor = None
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
     
-    cursor.execute('''
-        INSERT INTO progress (user_id, game_id, score, time_spent, completed, gestures_used, game_specific_data)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (progress.user_id, progress.game_id, progress.score, progress.time_spent, 
-          progress.completed, json.dumps(progress.gestures_used), 
-          json.dumps(progress.game_specific_data) if progress.game_specific_data else None))
+    if decompressor is not None:
+        try:
+            body = decompressor.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+    if len(body) > limit:
+        raise HTTPException(status_code=413, detail=f"Body larger than {limit} bytes")
+    return body
+
+def describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors())
+
+@app.post("/progress/bulk")
+async def save_progress_bulk(request: Request):
+    """Sync progress recorded while offline.
     
-    conn.commit()
-    return {"message": "Progress saved successfully"}
+    The body is a JSON array of progress records, optionally gzip or
+    deflate compressed (Content-Encoding). Each record carries a
+    ``client_key`` made on the device; a key already stored for that user
+    is reported as a duplicate instead of being inserted again, so an
+    interrupted sync can simply be resent. New records are committed in one
+    transaction. ``results`` holds one status per record, in order:
+    "created", "duplicate", or "invalid" with the validation error, which
+    does not stop the rest of the batch.
+    """
+    body = decompress_body(await request.body(), request.headers.get("content-encoding"), MAX_BULK_BYTES)
+    try:
+        records = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of progress records")
+    if len(records) > MAX_BULK_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_RECORDS} records per request")
+    
+    results = []
+    rows = []
+    received_at = datetime.now(timezone.utc)
+    for record in records:
+        client_key = record.get("client_key") if isinstance(record, dict) else None
+        try:
+            progress = models.ProgressRecord.model_validate(record)
+        except ValidationError as e:
+            results.append({"client_key": client_key, "status": "invalid", "error": describe_validation_error(e)})
+            continue
+        
+        created_at = progress.created_at or received_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        results.append({"client_key": client_key, "status": None})
+        rows.append(database.progress_row(
+            progress.user_id, progress.game_id, progress.score, progress.time_spent, progress.completed,
+            progress.gestures_used, progress.game_specific_data,
+            # A device clock running ahead must not put progress in the future
+            min(created_at, received_at), progress.client_key
+        ))
+    
+    inserted = iter(await database.run_db(database.insert_progress_records, rows) if rows else [])
+    for result in results:
+        if result["status"] is None:
+            result["status"] = "created" if next(inserted) else "duplicate"
+    
+    counts = {status: sum(result["status"] == status for result in results)
+              for status in ("created", "duplicate", "invalid")}
+    return dict(counts, results=results)
+
+MAX_BATCH_FRAMES = int(os.environ.get("GESTURE_MAX_BATCH", "64"))
+
+def gesture_session_id(session_id: Optional[str], x_session_id: Optional[str]) -> str:
+    # Tracking state is per student, and students behind one NAT or proxy share an address
+    session_id = session_id or x_session_id
+    if not session_id:
+        raise HTTPException(status_code=400, detail="A session_id query parameter or X-Session-Id header is required")
+    return session_id
+
+# Body content types accepted by /process-gesture/ and the frame format each implies
+FRAME_CONTENT_TYPES = {
+    "application/octet-stream": "jpeg",
+    "image/jpeg": "jpeg",
+    "image/png": "jpeg",
+    "image/webp": "jpeg",
+    "application/x-raw-rgb": "rgb",
+    "application/x-raw-rgba": "rgba",
+    "application/x-raw-bgr": "bgr",
+    "application/x-raw-i420": "i420",
+    "application/x-raw-nv12": "nv12",
+    "application/x-raw-nv21": "nv21"
+}
 
 @app.post("/process-gesture/")
-async def process_gesture(image_data: str):
-    """Process hand gesture from base64 image"""
+async def process_gesture(request: Request, image_data: Optional[str] = None, session_id: Optional[str] = None,
+                          width: Optional[int] = None, height: Optional[int] = None,
+                          x_session_id: Optional[str] = Header(None)):
+    """Process hand gesture from base64 image.
+    
+    Without ``image_data`` the request body itself is the frame: an encoded
+    image (image/jpeg, image/png, application/octet-stream) or raw pixels
+    (application/x-raw-rgb, -rgba, -bgr, -i420, -nv12, -nv21) whose
+    ``width`` and ``height`` are given as query parameters. The body is
+    decoded in place, and raw RGB skips colour conversion entirely.
+    
+    ``session_id`` (or an X-Session-Id header) names the student whose
+    hand tracking the frame continues, and is required.
+    """
+    session_id = gesture_session_id(session_id, x_session_id)
+    precision = negotiate_precision(request.headers.get("accept"))
+    frame_layout = {}
+    
     try:
-        # Decode base64 image
-        image_data = image_data.split(",")[1]  # Remove data URL prefix
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if image_data is not None:
+            # Decode base64 image
+            with metrics.GESTURE_STAGE_SECONDS.time("base64_decode"):
+                image_data = image_data.split(",")[1]  # Remove data URL prefix
+                image_bytes = base64.b64decode(image_data)
+        else:
+            content_type = request.headers.get("content-type", "").split(";")[0].strip()
+            frame_format = FRAME_CONTENT_TYPES.get(content_type)
+            if frame_format is None:
+                raise HTTPException(status_code=415, detail=f"Unsupported frame content type: {content_type}")
+            frame_layout = {"frame_format": frame_format, "width": width, "height": height}
+            image_bytes = await request.body()
         
-        if frame is None:
-            raise HTTPException(status_code=400, detail="Invalid image data")
+        # Decode and process gesture in the session's worker
+        gesture_data = await inference_pool.process(session_id, image_bytes, frame_layout, precision)
         
-        # Process gesture
-        gesture_data = gesture_recognizer.process_frame(frame)
+        if precision is not None:
+            return Response(content=gesture_data, media_type=COMPACT_MEDIA_TYPE)
         
-        return gesture_data
+        with metrics.GESTURE_STAGE_SECONDS.time("json_encode"):
+            body = json.dumps(gesture_data)
+        return Response(content=body, media_type="application/json")
         
+    except HTTPException:
+        raise
+    except FrameSuperseded:
+        # A newer frame from this session is already queued; the client only needs that one
+        return Response(status_code=204, headers={"X-Gesture-Skipped": "superseded"})
+    except InvalidFrame as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except (InferenceQueueFull, InferenceWorkerLost, RecognizerPoolFull) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing gesture: {str(e)}")
 
-@app.get("/analytics/{user_id}")
-async def get_user_analytics(user_id: int, conn = Depends(get_db_connection)):
-    cursor = conn.cursor()
-    
-    # Get user progress
-    cursor.execute('''
-        SELECT g.title, g.subject, AVG(p.score) as avg_score, 
-               SUM(p.time_spent) as total_time, COUNT(p.id) as games_played
-        FROM progress p
-        JOIN games g ON p.game_id = g.id
-        WHERE p.user_id = ?
-        GROUP BY g.id
-    ''', (user_id,))
-    
-    progress_data = cursor.fetchall()
-    
-    # Get weekly engagement
-    cursor.execute('''
-        SELECT DATE(created_at) as date, SUM(time_spent) as daily_time
-        FROM progress
-        WHERE user_id = ? AND created_at >= date('now', '-7 days')
-        GROUP BY DATE(created_at)
-    ''', (user_id,))
-    
-    weekly_engagement = cursor.fetchall()
+def parse_timestamps(value: str, count: int) -> List[float]:
+    """Parse comma-separated capture times in milliseconds, one per frame, into seconds"""
+    try:
+        timestamps = [float(part) / 1000 for part in value.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="timestamps must be comma-separated numbers")
+    if len(timestamps) != count:
+        raise HTTPException(status_code=400, detail=f"Expected {count} timestamps, one per frame")
+    if not all(math.isfinite(timestamp) for timestamp in timestamps) or \
+            any(later < earlier for earlier, later in zip(timestamps, timestamps[1:])):
+        raise HTTPException(status_code=400, detail="timestamps must be finite and in frame order")
+    return timestamps
+
+@app.post("/process-gesture/batch")
+async def process_gesture_batch(request: Request, session_id: Optional[str] = None,
+                                timestamps: Optional[str] = None, x_session_id: Optional[str] = Header(None)):
+    """Process a burst of frames in one round trip.
+    
+    Frames come either as multipart/form-data "frames" file parts, or as a
+    packed binary body where each frame is a little-endian uint32 byte
+    length followed by the encoded image. Frames are classified in upload
+    order through the session's recognizer, and the response holds each
+    frame's result plus the gesture timeline across the burst.
+    
+    ``timestamps`` (a query parameter, or a multipart field) gives each
+    frame's capture time in milliseconds, comma-separated. Motion gestures
+    and smoothing are measured against them; without them frames are
+    assumed to be GESTURE_BATCH_FRAME_INTERVAL apart.
+    """
+    session_id = gesture_session_id(session_id, x_session_id)
+    
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        frames = [await upload.read() for upload in form.getlist("frames")]
+        timestamps = timestamps or form.get("timestamps")
+    else:
+        try:
+            frames = unpack_frames(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    if not frames:
+        raise HTTPException(status_code=400, detail="No frames in batch")
+    if not all(frames):
+        raise HTTPException(status_code=400, detail="Empty frame in batch")
+    if len(frames) > MAX_BATCH_FRAMES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FRAMES} frames per batch")
+    if timestamps is not None:
+        timestamps = parse_timestamps(timestamps, len(frames))
+    
+    try:
+        return await inference_pool.process_batch(session_id, frames, timestamps=timestamps)
+    except (InferenceQueueFull, InferenceWorkerLost, RecognizerPoolFull) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def stream_frame_layout(config: Dict) -> Dict:
+    """Frame layout declared by a stream configuration message; raises ValueError if it is invalid"""
+    frame_format = config.get("format", "jpeg")
+    width, height = config.get("width"), config.get("height")
+    if not isinstance(frame_format, str) or (frame_format != "jpeg" and frame_format not in RAW_FRAME_FORMATS):
+        raise ValueError(f"Unsupported frame format: {frame_format}")
+    # Raw pixels need their size; an encoded image carries its own
+    sizes = (width, height) if frame_format != "jpeg" else [size for size in (width, height) if size is not None]
+    if not all(isinstance(size, int) and not isinstance(size, bool) for size in sizes):
+        raise ValueError("width and height must be integers")
+    return {"frame_format": frame_format, "width": width, "height": height}
+
+@app.websocket("/ws/gesture")
+async def gesture_stream(websocket: WebSocket):
+    """Stream hand gesture frames over a persistent socket.
+    
+    Binary messages carry one frame each: an encoded image (JPEG/PNG/WebP) by
+    default, or raw pixels once the client has declared the frame layout with
+    a text message such as {"format": "rgba", "width": 320, "height": 240}
+    (formats: rgb, rgba, bgr, i420, nv12, nv21). With "timestamps": true in
+    that message, every frame starts with its capture time in milliseconds
+    as a little-endian float64; otherwise frames are timed by their arrival.
+    Every frame is answered, in order, with the same payload as
+    /process-gesture/, as JSON text or, with ?encoding=compact, as a binary
+    compact message. Frames go through a StreamPipeline in the session's
+    gesture worker, so clients may keep a few frames in flight; if they
+    outrun inference the oldest queued frame is answered with
+    {"skipped": "overflow"} instead, and frames arriving while the gesture
+    queue is full with {"skipped": "queue_full"}.
+    """
+    await websocket.accept()
+    precision = stream_precision(websocket.query_params.get("encoding"))
+    
+    # One tracking context per socket unless the client resumes a named session
+    session_id = websocket.query_params.get("session_id")
+    owns_session = session_id is None
+    if owns_session:
+        session_id = f"ws-{uuid.uuid4().hex}"
+    frame_layout = {"frame_format": "jpeg", "width": None, "height": None}
+    timestamped = False
+    # Maps the client's capture clock onto time.monotonic(), from the first stamped frame
+    clock_offset: Optional[float] = None
+    
+    # The session's worker sends results back to the event loop, which owns the socket
+    outbox: asyncio.Queue = asyncio.Queue()
+    stream = inference_pool.open_stream(
+        session_id,
+        outbox.put_nowait,
+        precision=precision,
+        queue_size=GESTURE_STREAM_QUEUE,
+        discard_session=owns_session
+    )
+    
+    async def send_results():
+        while True:
+            payload = await outbox.get()
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
     
+    sender = asyncio.create_task(send_results())
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("text") is not None:
+                try:
+                    config = json.loads(message["text"])
+                    frame_layout = stream_frame_layout(config)
+                    timestamped = bool(config.get("timestamps", False))
+                except (ValueError, AttributeError):
+                    # Through the pipeline so it stays in order with frame results
+                    stream.send({"error": "Invalid stream configuration"})
+                continue
+            
+            # Frames queue before inference, so they are timed now rather than when processed
+            data, timestamp = message["bytes"], time.monotonic()
+            if timestamped:
+                try:
+                    captured, data = split_frame_timestamp(data)
+                except ValueError as e:
+                    stream.send({"error": str(e)})
+                    continue
+                if clock_offset is None:
+                    clock_offset = timestamp - captured
+                timestamp = captured + clock_offset
+            stream.submit(data, frame_layout, timestamp)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # The worker finishes queued frames and releases the session in the background
+        stream.close()
+        sender.cancel()
+
+@app.get("/gesture/stats")
+async def get_gesture_stats():
+    """Queue depth and open streams plus per-worker recognizer, ROI path and motion gate counts"""
     return {
-        "progress": [dict(row) for row in progress_data],
-        "weekly_engagement": [dict(row) for row in weekly_engagement]
+        "queue": inference_pool.stats(),
+        "workers": inference_pool.worker_stats()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus-style latency histograms plus gesture queue gauges"""
+    queue = inference_pool.stats()
+    gauges = metrics.render_value("gesture_queue_in_flight", "gauge",
+                                  "Frames queued or running in the inference pool",
+                                  {None: queue["in_flight"]})
+    gauges += metrics.render_value("gesture_queue_waiting", "gauge",
+                                   "Frames parked behind a running frame of the same session",
+                                   {None: queue["waiting"]})
+    gauges += metrics.render_value("gesture_frames_dropped_total", "counter",
+                                   "Frames not processed: queue full, replaced by a newer frame, or stream overflow",
+                                   {'{reason="queue_full"}': queue["rejected"],
+                                    '{reason="superseded"}': queue["superseded"],
+                                    '{reason="stream_overflow"}': queue["stream_overflow"]})
+    
+    gauges += metrics.render_value("db_operations_pending", "gauge",
+                                   "Database operations queued or running on the DB threads",
+                                   {None: database.pending_operations()})
+    if progress_writer is not None:
+        progress = progress_writer.stats()
+        gauges += metrics.render_value("progress_backlog_rows", "gauge",
+                                       "Progress rows accepted but not yet committed",
+                                       {None: progress["backlog_rows"]})
+        gauges += metrics.render_value("progress_backlog_age_seconds", "gauge",
+                                       "Age of the oldest uncommitted progress row",
+                                       {None: round(progress["backlog_age_seconds"], 3)})
+        gauges += metrics.render_value("progress_rows_total", "counter",
+                                       "Progress rows by outcome: written, rejected (backlog full) or lost at shutdown",
+                                       {'{outcome="written"}': progress["rows_written"],
+                                        '{outcome="rejected"}': progress["rejected"],
+                                        '{outcome="lost"}': progress["rows_lost"]})
+        gauges += metrics.render_value("progress_flushes_total", "counter",
+                                       "Batched progress commits by result",
+                                       {'{result="ok"}': progress["flushes"],
+                                        '{result="error"}': progress["flush_errors"]})
+    gauges += metrics.render_value("process_resident_memory_bytes", "gauge",
+                                   "Resident memory of the API process",
+                                   {None: metrics.process_rss_bytes() or 0})
+    if startup_seconds is not None:
+        gauges += metrics.render_value("api_startup_seconds", "gauge",
+                                       "Seconds from import to ready, including gesture warm-up",
+                                       {None: round(startup_seconds, 3)})
+    
+    # Workers report their counters with each result, so a scrape never waits on the gesture queue
+    counters = inference_pool.recognizer_counters()
+    gauges += metrics.render_value("gesture_recognizer_events_total", "counter",
+                                   "ROI/full-frame inference paths and motion gate decisions",
+                                   {f'{{event="{name}"}}': count for name, count in counters.items()})
+    pools = [report["recognizers"] for report in inference_pool.worker_stats()]
+    gauges += metrics.render_value("gesture_recognizer_evictions_total", "counter",
+                                   "Recognizers closed to make room (lru) or after idling (ttl)",
+                                   {'{reason="lru"}': sum(pool.get("evicted_lru", 0) for pool in pools),
+                                    '{reason="ttl"}': sum(pool.get("evicted_ttl", 0) for pool in pools)})
+    gauges += metrics.render_value("gesture_recognizer_churn_total", "counter",
+                                   "Sessions whose recognizer was rebuilt after an lru eviction; "
+                                   "raise GESTURE_WORKER_POOL_SIZE if this keeps growing",
+                                   {None: sum(pool.get("rebuilt_after_eviction", 0) for pool in pools)})
+    
+    return PlainTextResponse(metrics.render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+@app.post("/process-landmarks/")
+async def process_landmarks(frame: models.LandmarkFrame, request: Request, session_id: Optional[str] = None,
+                            x_session_id: Optional[str] = Header(None)):
+    """Classify gestures from landmarks tracked on the client"""
+    landmarks = landmarks_from_lists(frame.hands)
+    if landmarks is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected up to {MAX_HANDS} hands of 21 [x, y, z] landmarks"
+        )
+    
+    session_id = gesture_session_id(session_id, x_session_id)
+    if stream_recorder is not None:
+        stream_recorder.append(session_id, landmarks)
+    
+    with metrics.GESTURE_STAGE_SECONDS.time("classify"):
+        if landmark_trackers is None:
+            gesture_data = landmark_classifier.classify_landmarks(landmarks)
+        else:
+            try:
+                with landmark_trackers.session(session_id) as tracker:
+                    gesture_data = landmark_classifier.classify_landmarks(tracker.update(landmarks), tracker)
+            except RecognizerPoolFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    
+    precision = negotiate_precision(request.headers.get("accept"))
+    if precision is not None:
+        return Response(content=encode_compact(gesture_data, precision), media_type=COMPACT_MEDIA_TYPE)
+    return gesture_data
+
+@app.websocket("/ws/landmarks")
+async def landmark_stream(websocket: WebSocket):
+    """Stream client-side hand landmarks over a persistent socket.
+    
+    Each binary message is one frame of packed little-endian float32
+    landmarks (hands x 21 x 3, i.e. 252 bytes per hand; an empty message
+    means no hands). Text messages may carry the same JSON body as
+    /process-landmarks/. Results follow the ?encoding= choice of /ws/gesture.
+    """
+    await websocket.accept()
+    precision = stream_precision(websocket.query_params.get("encoding"))
+    session_id = websocket.query_params.get("session_id") or f"ws-{uuid.uuid4().hex}"
+    tracker = TemporalTracker() if landmark_trackers is not None else None
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("text") is not None:
+                try:
+                    landmarks = landmarks_from_lists(json.loads(message["text"])["hands"])
+                except (ValueError, KeyError, TypeError):
+                    landmarks = None
+            else:
+                landmarks = decode_landmarks(message["bytes"])
+            
+            if landmarks is None:
+                await websocket.send_json({"error": "Invalid landmark data"})
+                continue
+            
+            if tracker is not None:
+                gesture_data = landmark_classifier.classify_landmarks(tracker.update(landmarks), tracker)
+            else:
+                gesture_data = landmark_classifier.classify_landmarks(landmarks)
+            if stream_recorder is not None:
+                stream_recorder.append(session_id, landmarks)
+            if precision is not None:
+                await websocket.send_bytes(encode_compact(gesture_data, precision))
+            else:
+                await websocket.send_json(gesture_data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if stream_recorder is not None:
+            stream_recorder.close_session(session_id)
+
+@app.get("/analytics/{user_id}")
+async def get_user_analytics(user_id: int):
+    return await database.run_db(database.user_analytics, user_id)
+
+@app.get("/analytics/school/{school}")
+async def get_school_analytics(school: str, grade: Optional[int] = None, days: int = Query(30, ge=1, le=365)):
+    """Teacher dashboard aggregates for a school, or one grade (class) in it.
+    
+    Covers the last ``days`` days: per-grade summaries, per-subject averages,
+    the daily engagement trend and how students' average scores are
+    distributed, each from one set-based query over the progress_daily
+    rollup instead of a call per student.
+    """
+    analytics = await database.run_db(database.group_analytics, school, grade, days)
+    if analytics is None:
+        raise HTTPException(status_code=404, detail="No students found for this school and grade")
+    return analytics
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
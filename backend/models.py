@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -39,6 +39,12 @@ class ProgressCreate(BaseModel):
     gestures_used: Dict[str, Any]
     game_specific_data: Optional[Dict[str, Any]] = None
 
+class ProgressRecord(ProgressCreate):
+    # Generated on the device, so a record resent after a dropped sync is stored once
+    client_key: str = Field(min_length=1, max_length=64)
+    # When the record was made on the device; defaults to when the server receives it
+    created_at: Optional[datetime] = None
+
 class AnalyticsResponse(BaseModel):
     user_id: int
     game_id: int
@@ -51,6 +57,10 @@ class GestureData(BaseModel):
     gesture_type: str
     confidence: float
 
+class LandmarkFrame(BaseModel):
+    # One entry per hand, each holding MediaPipe's 21 [x, y, z] landmarks
+    hands: List[List[List[float]]]
+
 # Game-specific models
 class PhysicsGameData(BaseModel):
     object_type: str
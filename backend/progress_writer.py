@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import database
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ProgressWriter:
+    """Write-behind buffer for progress rows.
+
+    ``submit`` only appends to an in-memory list, so /progress/ is answered
+    without waiting on SQLite. A background thread writes everything buffered
+    with one executemany and a single commit as soon as ``flush_rows`` rows
+    have built up or the oldest has waited ``flush_interval`` seconds, so a
+    class finishing a level together costs a few commits instead of one per
+    student. Failed writes keep their rows and are retried.
+
+    ``close`` stops accepting rows and writes out everything still buffered.
+    Only a crash loses rows: at most the last ``flush_interval`` seconds' worth.
+    
+    The writer has a connection of its own, so a flush never holds one of
+    the pooled connections the DB threads serving requests rely on.
+    """
+
+    def __init__(self, flush_rows: int = 200, flush_interval: float = 0.5, max_backlog: int = 10000,
+                 close_attempts: int = 3):
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.close_attempts = close_attempts
+        self._rows: List[Tuple] = []
+        self._oldest = 0.0
+        self._writing = 0
+        self._retry_at = 0.0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._pool = database.ConnectionPool(database.DATABASE_URL, 1, database.DB_TIMEOUT, database.DB_CACHE_KIB)
+        self._stats = {"rows_written": 0, "flushes": 0, "flush_errors": 0, "rejected": 0, "rows_lost": 0}
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Tuple):
+        """Buffer a database.progress_row tuple; raises DatabaseBusy when the backlog is full"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Progress writer is closed")
+            if len(self._rows) + self._writing >= self.max_backlog:
+                self._stats["rejected"] += 1
+                raise database.DatabaseBusy("Progress backlog is full")
+
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            # The first row starts the flush timer, a full batch flushes straight away
+            if len(self._rows) == 1 or len(self._rows) >= self.flush_rows:
+                self._cond.notify()
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            age = time.monotonic() - self._oldest if self._rows else 0.0
+            return dict(self._stats, backlog_rows=len(self._rows) + self._writing, backlog_age_seconds=age)
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop accepting rows and wait until the buffered ones are written"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._pool.close()
+
+    def _next_batch(self) -> Optional[Tuple[List[Tuple], float]]:
+        """Wait until a flush is due and take the buffered rows, or None once closed and empty"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._rows:
+                    due = now if self._closed or len(self._rows) >= self.flush_rows \
+                        else self._oldest + self.flush_interval
+                    due = max(due, self._retry_at)
+                    if due <= now:
+                        break
+                    self._cond.wait(due - now)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+
+            rows, self._rows = self._rows, []
+            self._writing = len(rows)
+            return rows, self._oldest
+
+    def _run(self):
+        failures = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            rows, oldest = batch
+
+            try:
+                with self._pool.connection() as conn:
+                    with database.DB_QUERY_SECONDS.time("insert_progress_rows"):
+                        database.insert_progress_rows(conn, rows)
+            except Exception:
+                failures += 1
+                logger.exception("Writing %d progress rows failed (attempt %d)", len(rows), failures)
+                with self._cond:
+                    self._writing = 0
+                    self._stats["flush_errors"] += 1
+                    if self._closed and failures >= self.close_attempts:
+                        logger.error("Dropping %d progress rows at shutdown", len(rows) + len(self._rows))
+                        self._stats["rows_lost"] += len(rows) + len(self._rows)
+                        self._rows = []
+                        continue
+                    # Back in front of anything submitted meanwhile, and retried after a pause
+                    self._rows[:0] = rows
+                    self._oldest = oldest
+                    self._retry_at = time.monotonic() + self.flush_interval
+                continue
+
+            failures = 0
+            with self._cond:
+                self._writing = 0
+                self._retry_at = 0.0
+                self._stats["rows_written"] += len(rows)
+                self._stats["flushes"] += 1
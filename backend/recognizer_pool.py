@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from gesture_engine import GestureRecognizer
+
+
+class RecognizerPoolFull(Exception):
+    """Raised when every pooled recognizer is busy and the cap is reached"""
+
+
+class _PooledRecognizer:
+    def __init__(self, recognizer: GestureRecognizer):
+        self.recognizer = recognizer
+        self.lock = threading.Lock()
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+class RecognizerPool:
+    """Bounded set of GestureRecognizers keyed by client session.
+
+    Each session gets its own recognizer so MediaPipe's temporal tracking only
+    ever sees one student's frames. Idle sessions expire after ``ttl_seconds``
+    and, once ``max_instances`` is reached, the least recently used idle
+    session is evicted to make room for a new one. ``rebuilt_after_eviction``
+    counts sessions that came back after such an eviction: churn that
+    means max_instances is below the number of live sessions.
+    
+    ``factory`` may build any per-session object with ``close()`` and
+    ``counters()``, e.g. a TemporalTracker for landmark-only sessions.
+    """
+
+    def __init__(self, max_instances: int = 32, ttl_seconds: float = 300.0,
+                 factory: Callable[[], GestureRecognizer] = GestureRecognizer):
+        self.max_instances = max_instances
+        self.ttl_seconds = ttl_seconds
+        self.factory = factory
+        self._entries: "OrderedDict[str, _PooledRecognizer]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Sessions whose recognizer is being built outside the lock; they count against max_instances
+        self._building: Set[str] = set()
+        self._built = threading.Condition(self._lock)
+        self._stats = {"created": 0, "evicted_lru": 0, "evicted_ttl": 0, "rejected": 0, "rebuilt_after_eviction": 0}
+        # Sessions recently evicted to make room; one coming back means the pool is too small
+        self._evicted: "OrderedDict[str, None]" = OrderedDict()
+        # Per-recognizer counters of recognizers that have already been closed
+        self._retired_counters: Dict[str, int] = {}
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[GestureRecognizer]:
+        """Borrow the recognizer for a session, serializing frames within it"""
+        entry = self._acquire(session_id)
+        try:
+            with entry.lock:
+                yield entry.recognizer
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+
+    def discard(self, session_id: str):
+        """Drop a session's recognizer once its client has gone away"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry.users:
+                return
+            del self._entries[session_id]
+        self._retire(entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, instances=len(self._entries))
+
+    def recognizer_counters(self) -> Dict[str, int]:
+        """Inference path and motion gate counts summed over live and retired recognizers"""
+        with self._lock:
+            totals = dict(self._retired_counters)
+            for entry in self._entries.values():
+                for name, count in entry.recognizer.counters().items():
+                    totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def close(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._retire(entry)
+
+    def _retire(self, entry: _PooledRecognizer):
+        with self._lock:
+            for name, count in entry.recognizer.counters().items():
+                self._retired_counters[name] = self._retired_counters.get(name, 0) + count
+        entry.recognizer.close()
+
+    def _acquire(self, session_id: str) -> _PooledRecognizer:
+        evicted: List[_PooledRecognizer] = []
+
+        with self._lock:
+            evicted.extend(self._expire_idle())
+            while session_id in self._building:
+                # Another frame of this session is already building its recognizer
+                self._built.wait()
+            entry = self._checkout(session_id)
+            if entry is None:
+                evicted.extend(self._make_room())
+                self._building.add(session_id)
+                if session_id in self._evicted:
+                    del self._evicted[session_id]
+                    self._stats["rebuilt_after_eviction"] += 1
+
+        # Closing MediaPipe graphs is slow, so do it outside the pool lock
+        for stale in evicted:
+            self._retire(stale)
+        if entry is not None:
+            return entry
+
+        # Building one is just as slow, so other sessions keep using the pool meanwhile
+        try:
+            built = _PooledRecognizer(self.factory())
+        except BaseException:
+            with self._lock:
+                self._finish_building(session_id)
+            raise
+
+        with self._lock:
+            self._finish_building(session_id)
+            self._entries[session_id] = built
+            self._stats["created"] += 1
+            return self._checkout(session_id)
+
+    def _checkout(self, session_id: str) -> Optional[_PooledRecognizer]:
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            self._entries.move_to_end(session_id)
+            entry.users += 1
+        return entry
+
+    def _finish_building(self, session_id: str):
+        self._building.discard(session_id)
+        self._built.notify_all()
+
+    def _make_room(self) -> List[_PooledRecognizer]:
+        """Reserve room for one more recognizer, evicting the least recently used idle one if needed"""
+        if len(self._entries) + len(self._building) < self.max_instances:
+            return []
+        victim = self._least_recently_used_idle()
+        if victim is None:
+            self._stats["rejected"] += 1
+            raise RecognizerPoolFull(f"All {self.max_instances} gesture recognizers are busy")
+        self._stats["evicted_lru"] += 1
+        self._evicted[victim] = None
+        if len(self._evicted) > self.max_instances:
+            self._evicted.popitem(last=False)
+        return [self._entries.pop(victim)]
+
+    def _expire_idle(self) -> List[_PooledRecognizer]:
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [
+            session_id for session_id, entry in self._entries.items()
+            if not entry.users and entry.last_used < cutoff
+        ]
+        self._stats["evicted_ttl"] += len(expired)
+        return [self._entries.pop(session_id) for session_id in expired]
+
+    def _least_recently_used_idle(self):
+        for session_id, entry in self._entries.items():
+            if not entry.users:
+                return session_id
+        return None
@@ -0,0 +1,29 @@
+import pytest
+
+import database
+
+
+@pytest.fixture
+def conn(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / "test.db"), size=1)
+    with pool.connection() as conn:
+        database.create_schema(conn)
+        yield conn
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """The API on a scratch database, with gesture inference on threads instead of processes"""
+    from fastapi.testclient import TestClient
+
+    directory = tmp_path_factory.mktemp("api")
+    (directory / "static").mkdir()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("GESTURE_WORKERS", "0")
+        patch.setattr(database, "DATABASE_URL", str(directory / "api.db"))
+        # main mounts ./static when imported
+        patch.chdir(directory)
+        import main
+        with TestClient(main.app) as client:
+            yield client
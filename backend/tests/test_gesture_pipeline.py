@@ -0,0 +1,72 @@
+"""StreamPipeline answers every frame in order, even ones that fail"""
+import json
+import threading
+
+import numpy as np
+
+from gesture_pipeline import StreamPipeline
+from recognizer_pool import RecognizerPool
+
+
+class FakeRecognizer:
+    """Stands in for GestureRecognizer; a frame whose first pixel is 255 makes it fail"""
+
+    def __init__(self):
+        self.last_timings = {}
+        self.last_landmarks = None
+        self.color_orders = []
+
+    def process_frame(self, frame, color_order="bgr", timestamp=None):
+        if frame[0, 0, 0] == 255:
+            raise RuntimeError("MediaPipe failed")
+        self.color_orders.append(color_order)
+        return {"gestures": [], "stale": False}
+
+    def counters(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def run_pipeline(frames):
+    recognizers = RecognizerPool(max_instances=1, factory=FakeRecognizer)
+    emitted = []
+    pipeline = StreamPipeline("session", recognizers,
+                              emit=lambda payload, status, timings: emitted.append((status, json.loads(payload))),
+                              queue_size=len(frames))
+    for data, layout in frames:
+        pipeline.submit(data, layout)
+    closer = threading.Thread(target=pipeline.close, daemon=True)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive(), "close() must not hang after failed frames"
+    with recognizers.session("session") as recognizer:
+        return emitted, recognizer
+
+
+def rgb_frame(value):
+    return np.full((4, 4, 3), value, np.uint8).tobytes()
+
+
+def test_failed_frames_are_answered_in_order():
+    layout = {"frame_format": "rgb", "width": 4, "height": 4}
+    emitted, _ = run_pipeline([
+        (b"", {}),                                         # cv2.imdecode rejects an empty buffer
+        (rgb_frame(0), {"frame_format": ["rgb"], "width": 4, "height": 4}),
+        (rgb_frame(255), layout),                          # fails inside the recognizer
+        (rgb_frame(0), layout),
+    ])
+
+    assert emitted == [
+        ("frame", {"error": "Invalid image data"}),
+        ("frame", {"error": "Invalid image data"}),
+        ("frame", {"error": "Gesture processing failed"}),
+        ("frame", {"gestures": [], "stale": False}),
+    ]
+
+
+def test_bgr_frames_reach_the_recognizer_unconverted():
+    emitted, recognizer = run_pipeline([(rgb_frame(0), {"frame_format": "bgr", "width": 4, "height": 4})])
+    assert emitted == [("frame", {"gestures": [], "stale": False})]
+    assert recognizer.color_orders == ["bgr"]
@@ -0,0 +1,103 @@
+"""InferencePool coalescing (latest frame wins) and queue-full rejection, on threads"""
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+import inference_pool
+from inference_pool import FrameSuperseded, InferencePool, InferenceQueueFull
+
+LAYOUT = {"frame_format": "rgb", "width": 2, "height": 2}
+
+
+class BlockingRecognizer:
+    """Stands in for GestureRecognizer: records each frame's value and holds it until released"""
+
+    started = threading.Semaphore(0)
+    release = threading.Event()
+    processed = []
+
+    def __init__(self, **options):
+        self.last_timings = {}
+        self.last_landmarks = None
+        self.last_timestamp = None
+
+    def process_frame(self, frame, color_order="bgr", timestamp=None):
+        self.started.release()
+        self.release.wait(5)
+        self.processed.append(int(frame[0, 0, 0]))
+        return {"value": int(frame[0, 0, 0]), "stale": False}
+
+    def counters(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    BlockingRecognizer.started = threading.Semaphore(0)
+    BlockingRecognizer.release = threading.Event()
+    BlockingRecognizer.processed = []
+    monkeypatch.setattr(inference_pool, "GestureRecognizer", BlockingRecognizer)
+    pool = InferencePool(workers=0, queue_size=2)
+    yield pool
+    BlockingRecognizer.release.set()
+    pool.close()
+
+
+def frame(value):
+    return np.full((2, 2, 3), value, np.uint8).tobytes()
+
+
+async def running(pool, session_id, value):
+    """Submit a frame and wait until the recognizer is working on it"""
+    task = asyncio.create_task(pool.process(session_id, frame(value), LAYOUT))
+    await asyncio.to_thread(BlockingRecognizer.started.acquire, True, 5)
+    return task
+
+
+def test_latest_frame_wins(pool):
+    async def scenario():
+        first = await running(pool, "student", 1)
+        # While frame 1 runs, 2 waits and is then replaced by 3
+        second = asyncio.create_task(pool.process("student", frame(2), LAYOUT))
+        await asyncio.sleep(0)
+        third = asyncio.create_task(pool.process("student", frame(3), LAYOUT))
+        await asyncio.sleep(0)
+        BlockingRecognizer.release.set()
+        return await asyncio.gather(first, second, third, return_exceptions=True)
+
+    first, second, third = asyncio.run(scenario())
+
+    assert first["value"] == 1
+    assert isinstance(second, FrameSuperseded)
+    assert third["value"] == 3
+    assert BlockingRecognizer.processed == [1, 3]
+    stats = pool.stats()
+    assert (stats["superseded"], stats["in_flight"], stats["waiting"]) == (1, 0, 0)
+
+
+def test_full_queue_rejects_new_frames(pool):
+    async def scenario():
+        # queue_size=2: two sessions running fill it
+        tasks = [await running(pool, "a", 1), await running(pool, "b", 2)]
+        with pytest.raises(InferenceQueueFull):
+            await pool.process("c", frame(3), LAYOUT)
+        # A frame waiting behind its own session counts too
+        with pytest.raises(InferenceQueueFull):
+            await pool.process("a", frame(4), LAYOUT)
+        BlockingRecognizer.release.set()
+        results = await asyncio.gather(*tasks)
+        # Room again once the running frames are answered
+        results.append(await pool.process("c", frame(5), LAYOUT))
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert [result["value"] for result in results] == [1, 2, 5]
+    stats = pool.stats()
+    assert (stats["rejected"], stats["in_flight"], stats["waiting"]) == (2, 0, 0)
+    assert not pool._slots
@@ -0,0 +1,43 @@
+"""The progress_daily trigger keeps the same totals a full rebuild computes"""
+from datetime import datetime, timedelta, timezone
+
+import database
+
+ROLLUP_SQL = "SELECT * FROM progress_daily ORDER BY user_id, day, game_id"
+
+
+def rollup(conn):
+    return [tuple(row) for row in conn.execute(ROLLUP_SQL)]
+
+
+def test_trigger_matches_rebuild(conn):
+    database.fill_synthetic_progress(conn, rows=2000, users=20)
+    # Several sessions on one day, and NULL score and time, both folded into one rollup row
+    now = datetime.now(timezone.utc)
+    rows = [database.progress_row(1, 2, 70, 30, True, {}, None, now - timedelta(minutes=minutes))
+            for minutes in range(3)]
+    database.insert_progress_rows(conn, rows)
+    conn.execute("INSERT INTO progress (user_id, game_id, score, time_spent) VALUES (1, 2, NULL, NULL)")
+    conn.commit()
+
+    maintained = rollup(conn)
+    assert sum(row[3] for row in maintained) == 2004
+
+    database.rebuild_progress_daily(conn)
+    assert rollup(conn) == maintained
+
+
+def test_new_rollup_is_filled_from_existing_progress(tmp_path):
+    pool = database.ConnectionPool(str(tmp_path / "existing.db"), size=1)
+    with pool.connection() as conn:
+        database.create_schema(conn)
+        database.fill_synthetic_progress(conn, rows=500, users=10)
+        expected = rollup(conn)
+        # A database from before the rollup existed
+        conn.execute("DROP TRIGGER progress_daily_insert")
+        conn.execute("DROP TABLE progress_daily")
+        conn.commit()
+
+        database.create_schema(conn)
+        assert rollup(conn) == expected
+    pool.close()
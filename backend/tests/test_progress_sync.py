@@ -0,0 +1,56 @@
+"""/progress/bulk stores each client_key once and reports a status per record"""
+import gzip
+import json
+
+import database
+
+
+def record(user_id, client_key, score=50):
+    return {"user_id": user_id, "game_id": 1, "score": score, "time_spent": 30, "completed": True,
+            "gestures_used": {"drag": 1}, "client_key": client_key,
+            "created_at": "2024-06-01T10:00:00Z"}
+
+
+def stored_keys(user_id):
+    with database.get_db() as conn:
+        return sorted(row[0] for row in conn.execute("SELECT client_key FROM progress WHERE user_id = ?", (user_id,)))
+
+
+def test_duplicate_key_within_one_batch(client):
+    response = client.post("/progress/bulk", json=[record(101, "a"), record(101, "b"), record(101, "a", score=90)])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["created", "created", "duplicate"]
+    assert [result["client_key"] for result in body["results"]] == ["a", "b", "a"]
+    assert (body["created"], body["duplicate"], body["invalid"]) == (2, 1, 0)
+    assert stored_keys(101) == ["a", "b"]
+
+
+def test_resent_sync_is_idempotent(client):
+    first = client.post("/progress/bulk", json=[record(102, "a"), record(102, "b")]).json()
+    # An interrupted sync resent with one more record, gzip compressed
+    body = gzip.compress(json.dumps([record(102, "a"), record(102, "b"), record(102, "c")]).encode())
+    second = client.post("/progress/bulk", content=body,
+                         headers={"content-type": "application/json", "content-encoding": "gzip"}).json()
+
+    assert [result["status"] for result in first["results"]] == ["created", "created"]
+    assert [result["status"] for result in second["results"]] == ["duplicate", "duplicate", "created"]
+    assert stored_keys(102) == ["a", "b", "c"]
+
+
+def test_invalid_record_does_not_stop_the_batch(client):
+    invalid = dict(record(103, "b"), score="many")
+    body = client.post("/progress/bulk", json=[record(103, "a"), invalid, {"client_key": "c"}]).json()
+
+    assert [result["status"] for result in body["results"]] == ["created", "invalid", "invalid"]
+    assert "score" in body["results"][1]["error"]
+    assert body["results"][2]["client_key"] == "c"
+    assert stored_keys(103) == ["a"]
+
+
+def test_same_key_from_another_user_is_stored(client):
+    client.post("/progress/bulk", json=[record(104, "shared")])
+    body = client.post("/progress/bulk", json=[record(105, "shared")]).json()
+
+    assert body["results"][0]["status"] == "created"
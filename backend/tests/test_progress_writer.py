@@ -0,0 +1,52 @@
+"""ProgressWriter writes out everything still buffered when closed"""
+import pytest
+
+import database
+from progress_writer import ProgressWriter
+
+
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = str(tmp_path / "writer.db")
+    pool = database.ConnectionPool(url, size=1)
+    with pool.connection() as conn:
+        database.create_schema(conn)
+    pool.close()
+    monkeypatch.setattr(database, "DATABASE_URL", url)
+    return url
+
+
+def count_rows(url):
+    pool = database.ConnectionPool(url, size=1)
+    with pool.connection() as conn:
+        (count,) = conn.execute("SELECT COUNT(*) FROM progress").fetchone()
+    pool.close()
+    return count
+
+
+def test_close_drains_buffered_rows(database_url):
+    # Neither the row count nor the interval is reached, so only close() writes them
+    writer = ProgressWriter(flush_rows=1000, flush_interval=60)
+    for score in range(250):
+        writer.submit(database.progress_row(1, 1, score, 30, True, {}, None))
+    assert writer.stats()["backlog_rows"] == 250
+
+    writer.close(timeout=5)
+
+    assert count_rows(database_url) == 250
+    stats = writer.stats()
+    assert (stats["rows_written"], stats["flushes"], stats["backlog_rows"]) == (250, 1, 0)
+    with pytest.raises(RuntimeError):
+        writer.submit(database.progress_row(1, 1, 0, 30, True, {}, None))
+
+
+def test_full_backlog_is_rejected(database_url):
+    writer = ProgressWriter(flush_rows=1000, flush_interval=60, max_backlog=3)
+    for _ in range(3):
+        writer.submit(database.progress_row(1, 1, 50, 30, True, {}, None))
+    with pytest.raises(database.DatabaseBusy):
+        writer.submit(database.progress_row(1, 1, 50, 30, True, {}, None))
+    writer.close(timeout=5)
+
+    assert count_rows(database_url) == 3
+    assert writer.stats()["rejected"] == 1
@@ -0,0 +1,20 @@
+"""EXPLAIN QUERY PLAN checks for the hot analytics queries (database.QUERY_PLANS)"""
+import database
+
+
+def test_hot_queries_search_their_indexes(conn):
+    assert database.verify_query_plans(conn) == []
+
+
+def test_hot_queries_search_their_indexes_with_statistics(conn):
+    # ANALYZE lets the planner weigh real row counts instead of its heuristics
+    database.fill_synthetic_progress(conn, rows=20000, users=200)
+    conn.execute("ANALYZE")
+    assert database.verify_query_plans(conn) == []
+
+
+def test_missing_index_is_reported(conn):
+    conn.execute("DROP INDEX idx_users_school_role_grade")
+    problems = database.verify_query_plans(conn)
+    assert any("idx_users_school_role_grade" in problem for problem in problems)
+    assert any("scans a whole table: SCAN u" in problem for problem in problems)
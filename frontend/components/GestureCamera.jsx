@@ -36,6 +36,8 @@ const GestureCamera = ({ onGestureDetected, gameType, language = 'odia' }) => {
     }
   };
 
+  const socketRef = useRef(null);
+
   const startCamera = async () => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ 
@@ -51,45 +53,75 @@ const GestureCamera = ({ onGestureDetected, gameType, language = 'odia' }) => {
   };
 
   const processVideo = useCallback(async () => {
-    if (!videoRef.current || !isActive) return;
+    if (!videoRef.current) return;
 
     const canvas = canvasRef.current;
     const ctx = canvas.getContext('2d');
-    
-    const processFrame = async () => {
-      if (videoRef.current.readyState === videoRef.current.HAVE_ENOUGH_DATA) {
+
+    // One persistent socket per camera session; binary JPEG frames go up,
+    // gesture results come back as JSON. The server pipelines decoding and
+    // inference, so keep a couple of frames in flight to overlap them.
+    const socket = new WebSocket('ws://localhost:8000/ws/gesture');
+    socket.binaryType = 'arraybuffer';
+    socketRef.current = socket;
+    const maxInFlight = 2;
+    let inFlight = 0;
+
+    const sendFrame = () => {
+      if (socket.readyState !== WebSocket.OPEN) return;
+
+      if (inFlight < maxInFlight && videoRef.current?.readyState === videoRef.current?.HAVE_ENOUGH_DATA) {
+        const capturedAt = performance.now();
         ctx.drawImage(videoRef.current, 0, 0, canvas.width, canvas.height);
-        const imageData = canvas.toDataURL('image/jpeg');
-        
-        try {
-          const response = await fetch('http://localhost:8000/process-gesture/', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ image_data: imageData })
-          });
-          
-          const data = await response.json();
-          setGestureData(data);
-          onGestureDetected(data);
-          
-          // Provide audio feedback when gesture is detected
-          if (data.hands_detected > 0 && audioFeedback) {
-            speak(voiceInstructions[language].gesture);
+        inFlight += 1;
+        canvas.toBlob((blob) => {
+          if (blob && socket.readyState === WebSocket.OPEN) {
+            // Capture time first, so motion is measured at the real frame spacing
+            const stamp = new DataView(new ArrayBuffer(8));
+            stamp.setFloat64(0, capturedAt, true);
+            socket.send(new Blob([stamp.buffer, blob]));
+          } else {
+            inFlight -= 1;
           }
-        } catch (error) {
-          console.error('Error processing gesture:', error);
-        }
+        }, 'image/jpeg', 0.7);
+      }
+
+      requestAnimationFrame(sendFrame);
+    };
+
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ timestamps: true }));
+      sendFrame();
+    };
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      // Every message answers one frame: a result, an error or a skip
+      inFlight = Math.max(0, inFlight - 1);
+      if (data.skipped) {
+        // The server dropped an older frame in favour of a newer one
+        return;
       }
-      
-      if (isActive) {
-        requestAnimationFrame(processFrame);
+      if (data.error) {
+        console.error('Error processing gesture:', data.error);
+        return;
       }
+
+      setGestureData(data);
+      onGestureDetected(data);
+
+      // Provide audio feedback when gesture is detected
+      if (data.hands_detected > 0 && audioFeedback) {
+        speak(voiceInstructions[language].gesture);
+      }
+    };
+    socket.onerror = (error) => {
+      console.error('Gesture stream error:', error);
     };
-    
-    processFrame();
-  }, [isActive, onGestureDetected, audioFeedback, language]);
+  }, [onGestureDetected, audioFeedback, language]);
 
   const stopCamera = () => {
+    socketRef.current?.close();
+    socketRef.current = null;
     if (videoRef.current?.srcObject) {
       videoRef.current.srcObject.getTracks().forEach(track => track.stop());
     }
@@ -99,6 +131,7 @@ const GestureCamera = ({ onGestureDetected, gameType, language = 'odia' }) => {
 
   useEffect(() => {
     return () => {
+      socketRef.current?.close();
       if (videoRef.current?.srcObject) {
         videoRef.current.srcObject.getTracks().forEach(track => track.stop());
       }